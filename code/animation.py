@@ -0,0 +1,39 @@
+# one looping animation shared by every sprite that shows it, e.g. all the water on the map
+class Animation:
+    __slots__ = ('frames', 'speed', 'frame_index', 'index')
+
+    def __init__(self, frames, speed):
+        self.frames = frames
+        # frames per second
+        self.speed = speed
+        self.frame_index = 0
+        # the current frame as a whole number, what the sprites read
+        self.index = 0
+
+    def update(self, dt):
+        self.frame_index += self.speed * dt
+        if self.frame_index >= len(self.frames):
+            self.frame_index = 0
+        self.index = int(self.frame_index)
+
+    @property
+    def frame(self):
+        return self.frames[self.index]
+
+# advances every shared animation once a frame, so the cost does not depend on how many sprites use them
+class AnimationClock:
+    def __init__(self):
+        # name -> Animation
+        self.animations = {}
+
+    def animation(self, name, frames, speed):
+        # the first caller creates the animation, everyone after shares it
+        if name not in self.animations:
+            self.animations[name] = Animation(frames, speed)
+        return self.animations[name]
+
+    def update(self, dt):
+        for animation in self.animations.values():
+            animation.update(dt)
+
+clock = AnimationClock()
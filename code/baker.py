@@ -0,0 +1,47 @@
+import pygame
+from settings import *
+from sprites import Generic, AnimatedSprite
+
+# composes tiles that never change into a few large surfaces so they only cost a handful of blits per frame
+class StaticBaker:
+    def __init__(self):
+        # chunk key -> tiles (pos, surf) to compose into that chunk, in the order they were added
+        self.tiles = {}
+        # the same for tiles playing a shared animation, (chunk key, animation) -> tiles (pos, frames)
+        self.animated = {}
+
+    def key(self, pos, surf, z):
+        x, y = pos
+        if z == LAYERS['main']:
+            # tiles sharing the main layer are y-sorted against the player, so they are baked into strips of a single tile row
+            # every tile in a strip has the same top and height, so the strip sorts exactly like the tiles it replaces
+            return (z, x // CHUNK_SIZE, y, surf.get_height())
+        return (z, x // CHUNK_SIZE, y // CHUNK_SIZE)
+
+    def add(self, pos, surf, z):
+        self.tiles.setdefault(self.key(pos, surf, z), []).append((pos, surf))
+
+    def add_animated(self, pos, animation, z):
+        # every frame of the animation is baked into its own chunk surface, the chunk then shows the shared current frame
+        key = (self.key(pos, animation.frames[0], z), animation)
+        self.animated.setdefault(key, []).append((pos, animation.frames))
+
+    def compose(self, tiles):
+        rects = [frame.get_rect(topleft = pos) for pos, frame in tiles]
+        area = rects[0].unionall(rects[1:])
+
+        # blit the tiles in the order they were added so later map layers still cover earlier ones
+        chunk = pygame.Surface(area.size, pygame.SRCALPHA)
+        chunk.blits([(frame, (rect.x - area.x, rect.y - area.y)) for (_, frame), rect in zip(tiles, rects)], False)
+        return area, chunk
+
+    def bake(self, groups):
+        for key, tiles in self.tiles.items():
+            area, chunk = self.compose(tiles)
+            Generic(area.topleft, chunk, groups, key[0])
+        self.tiles.clear()
+
+        for (key, animation), tiles in self.animated.items():
+            frames = [self.compose([(pos, tile_frames[index]) for pos, tile_frames in tiles]) for index in range(len(animation.frames))]
+            AnimatedSprite(frames[0][0].topleft, [chunk for _, chunk in frames], groups, animation, key[0])
+        self.animated.clear()
@@ -0,0 +1,296 @@
+import os
+import sys
+# run headless, the benchmarks never need a window or a sound card
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+# and no import banner in front of the --json output
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import argparse
+import json
+import math
+import platform
+import random
+import time
+import pygame
+from settings import *
+from headless import create_level
+from grid import SoilGrid, FARMABLE, TILLED
+from sprites import Generic
+
+# every benchmark returns the time of one call in seconds, the harness repeats it and keeps the best/median
+def measure(func, repeat, setup = None):
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {
+        'min_ms': round(samples[0] * 1000, 4),
+        'median_ms': round(samples[len(samples) // 2] * 1000, 4),
+        'repeat': repeat
+    }
+
+def scatter_sprites(level, count, z = LAYERS['main']):
+    # extra sprites spread over the whole map
+    surf = pygame.Surface((TILE_SIZE, TILE_SIZE))
+    width, height = level.soil_layer.grid.width * TILE_SIZE, level.soil_layer.grid.height * TILE_SIZE
+    return [Generic((random.randrange(width), random.randrange(height)), surf, level.all_sprites, z) for _ in range(count)]
+
+def synthetic_grid(width, height, tilled = 0.5):
+    grid = SoilGrid(width, height, bytes([FARMABLE]) * (width * height))
+    for index in random.sample(range(width * height), int(width * height * tilled)):
+        grid.cells[index] |= TILLED
+    return grid
+
+def bench_custom_draw(level, scales, repeat):
+    results = {}
+    for count in scales:
+        sprites = scatter_sprites(level, count)
+        level.all_sprites.update(0)
+        results[str(count)] = measure(lambda: level.all_sprites.custom_draw(level.player), repeat)
+        for sprite in sprites:
+            sprite.kill()
+    return results
+
+def bench_collision(level, scales, repeat):
+    results = {}
+    player = level.player
+    for count in scales:
+        # dense colliders packed in a ring around the player
+        surf = pygame.Surface((TILE_SIZE, TILE_SIZE))
+        colliders = [Generic(
+            (player.rect.centerx + random.randint(-20, 20) * TILE_SIZE, player.rect.centery + random.randint(-20, 20) * TILE_SIZE),
+            surf, level.collision_sprites) for _ in range(count)]
+
+        def collide():
+            player.collision('horizontal')
+            player.collision('vertical')
+        results[str(count)] = measure(collide, repeat)
+        for sprite in colliders:
+            sprite.kill()
+    return results
+
+def bench_soil(level, scales, repeat):
+    soil = level.soil_layer
+    original_grid = soil.grid
+    results = {'create_soil_grid': measure(soil.create_soil_grid, repeat)}
+
+    for size in scales:
+        def reset_grid():
+            for sprite in list(soil.soil_tiles.values()) + list(soil.water_tiles.values()):
+                sprite.kill()
+            soil.soil_tiles.clear()
+            soil.water_tiles.clear()
+            soil.grid = synthetic_grid(size, size)
+        results[f'create_soil_tiles_{size}'] = measure(soil.create_soil_tiles, repeat, reset_grid)
+        results[f'water_all_{size}'] = measure(soil.water_all, repeat, soil.remove_water)
+        results[f'remove_water_{size}'] = measure(soil.remove_water, repeat, soil.water_all)
+
+    soil.grid = original_grid
+    soil.create_soil_tiles()
+    return results
+
+def bench_setup(repeat):
+    import support, tilemap
+
+    def clear_caches():
+        # a cold load parses the map and decodes every asset again
+        tilemap.loaded_maps.clear()
+        support.assets.__init__()
+        pygame.mixer.stop()
+
+    return {
+        'cold': measure(create_level, max(1, repeat // 5), clear_caches),
+        'warm': measure(create_level, max(1, repeat // 5), pygame.mixer.stop)
+    }
+
+def bench_rain(level, repeat, step):
+    level.rain.raining = True
+    # run long enough for the pools to reach their steady state
+    for _ in range(round(2 / step)):
+        level.rain.update(step)
+
+    def frame():
+        level.rain.update(step)
+        level.all_sprites.custom_draw(level.player)
+    return {'steady_frame': measure(frame, repeat)}
+
+def bench_reset(level, scales, repeat):
+    soil = level.soil_layer
+    original_grid = soil.grid
+    results = {}
+    for count in scales:
+        # the map only has a few hundred farmable tiles, so every scale gets a made up farm just big enough for it
+        for plant in list(soil.plants.values()):
+            soil.remove_plant(plant)
+        soil.remove_water()
+        size = math.ceil(count ** 0.5)
+        soil.grid = synthetic_grid(size, size, tilled = 0)
+        # plant on count of its tiles and water everything
+        cells = soil.grid.positions(FARMABLE)[:count]
+        for x, y in cells:
+            soil.grid.set(x, y, TILLED)
+        soil.create_soil_tiles()
+        for x, y in cells:
+            soil.plant_seed((x * TILE_SIZE + 1, y * TILE_SIZE + 1), 'corn')
+        results[str(len(cells))] = measure(level.reset, repeat, soil.water_all)
+
+    for plant in list(soil.plants.values()):
+        soil.remove_plant(plant)
+    soil.remove_water()
+    soil.grid = original_grid
+    soil.create_soil_tiles()
+    return results
+
+def bench_lighting(level, repeat):
+    lighting = level.lighting
+    color = (200, 180, 220)
+
+    def tinted():
+        lighting.tint(color)
+        lighting.apply()
+    return {
+        # the tint pass as a multiplying fill of the whole screen, what the cached overlay replaced
+        'fill': measure(lambda: level.display_surface.fill(color, special_flags = pygame.BLEND_RGB_MULT), repeat),
+        'cached_blit': measure(tinted, repeat)
+    }
+
+def check_dirty_rects(level, frames, step):
+    # every partial frame has to match a full redraw of the same state, with the night tint on and rain falling
+    tracker = level.all_sprites
+    level.dirty_rects = True
+    level.set_raining(True)
+    partial, mismatched = 0, 0
+    for _ in range(frames):
+        level.sky.start_color = list(level.sky.end_color)
+        level.update(step)
+        if level.draw() is None:
+            continue
+        partial += 1
+        dirty_frame = level.display_surface.copy()
+
+        # a full redraw of the same frame, without disturbing what the tracker remembers
+        state = tracker.drawn, tracker.drawn_offset, tracker.renderer_rects
+        level.dirty_rects = False
+        level.draw()
+        level.dirty_rects = True
+        tracker.drawn, tracker.drawn_offset, tracker.renderer_rects = state
+
+        if pygame.image.tostring(dirty_frame, 'RGB') != pygame.image.tostring(level.display_surface, 'RGB'):
+            mismatched += 1
+        # keep drawing on top of the partial frame, so mistakes add up like they would on screen
+        level.display_surface.blit(dirty_frame, (0, 0))
+    level.dirty_rects = DIRTY_RECTS
+    return {'frames': frames, 'partial': partial, 'mismatched': mismatched}
+
+def check_save(level):
+    # the player section has to load back exactly what was saved
+    from save import SaveGame
+    player = level.player
+    saved = {'items': {'wood': 3, 'apple': 4, 'corn': 7, 'tomato': 8}, 'seeds': {'corn': 1, 'tomato': 2}, 'money': 321}
+    player.item_inventory.update(saved['items'])
+    player.seed_inventory.update(saved['seeds'])
+    player.money = saved['money']
+    save_game = SaveGame(None)
+    data = save_game.pack_player(level)
+
+    player.item_inventory.update(dict.fromkeys(player.item_inventory, 0))
+    player.seed_inventory.update(dict.fromkeys(player.seed_inventory, 0))
+    player.money = 0
+    save_game.load_player(level, data)
+    loaded = {'items': dict(player.item_inventory), 'seeds': dict(player.seed_inventory), 'money': player.money}
+    return {'saved': saved, 'loaded': loaded, 'match': saved == loaded}
+
+def run(scale, repeat):
+    random.seed(0)
+    level = create_level()
+    step = 1 / SIMULATION_RATE
+    small, medium, large = scale
+
+    return {
+        'custom_draw': bench_custom_draw(level, [small, medium, large], repeat),
+        'collision': bench_collision(level, [small, medium, large], repeat),
+        'soil': bench_soil(level, [50, 200, 500], repeat),
+        'setup': bench_setup(repeat),
+        'rain': bench_rain(level, repeat, step),
+        'lighting': bench_lighting(level, repeat),
+        'reset': bench_reset(create_level(), [10, 100, 1000], max(1, repeat // 5)),
+    }
+
+def flatten(results, prefix = ''):
+    # {'a': {'b': {'min_ms': ..}}} -> {'a.b': {...}}
+    flat = {}
+    for key, value in results.items():
+        if 'min_ms' in value:
+            flat[prefix + key] = value
+        else:
+            flat.update(flatten(value, f'{prefix}{key}.'))
+    return flat
+
+def compare(results, baseline, threshold):
+    # compares the best times against a saved run, returns the benchmarks that got slower than threshold
+    current, previous = flatten(results), flatten(baseline['results'])
+    regressions = []
+    for name, value in sorted(current.items()):
+        if name not in previous:
+            print(f'{name:40} {value["min_ms"]:>10.3f} ms   (new)')
+            continue
+        ratio = value['min_ms'] / max(previous[name]['min_ms'], 1e-9)
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  SLOWER'
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            flag = '  faster'
+        print(f'{name:40} {value["min_ms"]:>10.3f} ms   {ratio:6.2f}x{flag}')
+    return regressions
+
+def main(args = None):
+    parser = argparse.ArgumentParser(description = 'Time the per-frame hot paths of the game.')
+    parser.add_argument('--repeat', type = int, default = 20)
+    parser.add_argument('--scale', type = int, nargs = 3, default = [100, 1000, 10000], help = 'sprite counts for the draw and collision benchmarks')
+    parser.add_argument('--output', help = 'write the results (json) to this file, e.g. a new baseline')
+    parser.add_argument('--compare', help = 'baseline json to compare against')
+    parser.add_argument('--threshold', type = float, default = 0.1, help = 'relative slowdown reported as a regression')
+    parser.add_argument('--check-dirty', action = 'store_true', help = 'only check that dirty rect frames match full redraws')
+    parser.add_argument('--check-save', action = 'store_true', help = 'only check that the player survives a save and load')
+    args = parser.parse_args(args)
+
+    if args.check_save:
+        result = check_save(create_level())
+        print(f"player save round trip {'matches' if result['match'] else 'differs'}: {result['loaded']}")
+        return 0 if result['match'] else 1
+
+    if args.check_dirty:
+        random.seed(0)
+        result = check_dirty_rects(create_level(), 600, 1 / SIMULATION_RATE)
+        print(f"{result['mismatched']} of {result['partial']} partial frames differ from a full redraw")
+        return 1 if result['mismatched'] or not result['partial'] else 0
+
+    report = {
+        'python': platform.python_version(),
+        'pygame': pygame.version.ver,
+        'machine': platform.machine(),
+        'results': run(args.scale, args.repeat)
+    }
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent = 2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(report['results'], json.load(file), args.threshold)
+        if regressions:
+            print(f'{len(regressions)} regression(s) over {args.threshold:.0%}')
+            return 1
+    elif not args.output:
+        print(json.dumps(report, indent = 2))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,119 @@
+import pygame
+import json
+from settings import *
+
+# turns KEYDOWN/KEYUP events into game actions (see KEY_BINDINGS)
+# held(action) is true while a bound key is down, pressed(action) only on the step the key went down (or repeated)
+class Controls:
+    def __init__(self, bindings = KEY_BINDINGS, repeat = KEY_REPEAT, record = False):
+        self.bindings = bindings
+        # key code -> actions bound to it, resolved on first use because key codes need pygame to be initialised
+        self.key_map = None
+        # action -> (delay before the first repeat, interval between repeats) in seconds
+        self.repeat = repeat
+
+        # key events waiting for the next simulation step
+        self.queue = []
+        # action -> bound keys currently down
+        self.held_keys = {}
+        self.pressed_actions = set()
+        # action -> seconds until its next repeat
+        self.repeat_timers = {}
+
+        # every applied event as (time, key name, pressed), the format ScriptedControls replays
+        self.time = 0
+        self.log = [] if record else None
+
+    @property
+    def key_actions(self):
+        if self.key_map is None:
+            self.key_map = {}
+            for action, keys in self.bindings.items():
+                for key in keys:
+                    self.key_map.setdefault(pygame.key.key_code(key), []).append(action)
+        return self.key_map
+
+    def handle_event(self, event):
+        if event.type in (pygame.KEYDOWN, pygame.KEYUP) and event.key in self.key_actions:
+            self.push(event.key, event.type == pygame.KEYDOWN)
+
+    def push(self, key, pressed):
+        self.queue.append((key, pressed))
+
+    def update(self, dt):
+        self.time += dt
+        self.pressed_actions.clear()
+
+        # apply the queued events in order, a key tapped within one step still counts as a press
+        for key, pressed in self.queue:
+            if self.log is not None:
+                self.log.append((round(self.time, 4), pygame.key.name(key), pressed))
+            for action in self.key_actions[key]:
+                # an action can have several keys, it is held while any of them is down
+                keys = self.held_keys.setdefault(action, set())
+                was_held = bool(keys)
+                if pressed:
+                    keys.add(key)
+                else:
+                    keys.discard(key)
+
+                if keys and not was_held:
+                    self.pressed_actions.add(action)
+                    if action in self.repeat:
+                        self.repeat_timers[action] = self.repeat[action][0]
+                elif was_held and not keys:
+                    self.repeat_timers.pop(action, None)
+        self.queue.clear()
+
+        # central key repeat for held actions that allow it
+        for action in self.repeat_timers:
+            self.repeat_timers[action] -= dt
+            if self.repeat_timers[action] <= 0:
+                self.pressed_actions.add(action)
+                self.repeat_timers[action] += self.repeat[action][1]
+
+    def held(self, action):
+        return bool(self.held_keys.get(action))
+
+    def pressed(self, action):
+        return action in self.pressed_actions
+
+    def save(self, path):
+        with open(path, 'w') as file:
+            json.dump(self.log, file)
+
+# replays a timeline of (time in seconds, key name, pressed) entries instead of reading the keyboard
+class ScriptedControls(Controls):
+    def __init__(self, timeline, loop = False, **kwargs):
+        super().__init__(**kwargs)
+        # key names are turned into key codes as they play, pygame may not be initialised yet
+        self.timeline = sorted(timeline, key = lambda entry: entry[0])
+        # a looping script starts over once its last entry has played
+        self.length = self.timeline[-1][0] if self.timeline else 0
+        self.loop = loop and self.length > 0
+
+        self.script_time = 0
+        self.index = 0
+
+    @classmethod
+    def from_file(cls, path, loop = False):
+        with open(path) as file:
+            return cls(json.load(file), loop)
+
+    def update(self, dt):
+        # events follow the simulation clock, so the script plays the same however fast the simulation runs
+        self.script_time += dt
+        while True:
+            while self.index < len(self.timeline) and self.timeline[self.index][0] <= self.script_time:
+                _, name, pressed = self.timeline[self.index]
+                key = pygame.key.key_code(name)
+                if key in self.key_actions:
+                    self.push(key, pressed)
+                self.index += 1
+
+            if not (self.loop and self.index == len(self.timeline)):
+                break
+            self.script_time -= self.length
+            self.index = 0
+
+        super().update(dt)
@@ -0,0 +1,136 @@
+from array import array
+import re
+
+# soil cell flags, one bit per marker the soil layer used to keep in a list per cell
+FARMABLE = 1  # 'F' the tile can be hoed
+TILLED = 2    # 'X' the tile has been hoed into a soil patch
+WATERED = 4   # 'W' the soil patch has been watered today
+PLANTED = 8   # 'P' a plant is growing on the soil patch
+
+MARKERS = {'F': FARMABLE, 'X': TILLED, 'W': WATERED, 'P': PLANTED}
+
+# byte -> byte lookup tables used by bytes.translate to change every cell of the grid in one C level pass
+translate_tables = {}
+
+def translate_table(name, func):
+    if name not in translate_tables:
+        translate_tables[name] = bytes(func(value) for value in range(256))
+    return translate_tables[name]
+
+# a single cell of the grid that still behaves like the old list of markers ('X' in cell, cell.append('W'), cell.remove('P'))
+class SoilCell:
+    __slots__ = ('cells', 'index')
+
+    def __init__(self, cells, index):
+        self.cells = cells
+        self.index = index
+
+    def __contains__(self, marker):
+        return bool(self.cells[self.index] & MARKERS[marker])
+
+    def __iter__(self):
+        value = self.cells[self.index]
+        return iter([marker for marker, flag in MARKERS.items() if value & flag])
+
+    def append(self, marker):
+        self.cells[self.index] |= MARKERS[marker]
+
+    def remove(self, marker):
+        flag = MARKERS[marker]
+        if not self.cells[self.index] & flag:
+            raise ValueError(f'{marker!r} not in cell')
+        self.cells[self.index] &= ~flag
+
+    def __repr__(self):
+        return repr(list(self))
+
+class SoilRow:
+    __slots__ = ('cells', 'start', 'width')
+
+    def __init__(self, cells, start, width):
+        self.cells = cells
+        self.start = start
+        self.width = width
+
+    def __getitem__(self, col):
+        if col < 0:
+            col += self.width
+        if not 0 <= col < self.width:
+            raise IndexError('soil grid column out of range')
+        return SoilCell(self.cells, self.start + col)
+
+    def __len__(self):
+        return self.width
+
+    def __iter__(self):
+        return (SoilCell(self.cells, self.start + col) for col in range(self.width))
+
+# the state of every tile on the farm packed as one byte of flags per tile
+class SoilGrid:
+    def __init__(self, width, height, cells = None):
+        self.width = width
+        self.height = height
+        self.cells = array('B', cells if cells is not None else bytes(width * height))
+
+    # per cell api
+    def __getitem__(self, row):
+        if row < 0:
+            row += self.height
+        if not 0 <= row < self.height:
+            raise IndexError('soil grid row out of range')
+        return SoilRow(self.cells, row * self.width, self.width)
+
+    def __len__(self):
+        return self.height
+
+    def __iter__(self):
+        return (self[row] for row in range(self.height))
+
+    def inside(self, x, y):
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def has(self, x, y, flag):
+        # cells outside the map never have any flag
+        return self.inside(x, y) and bool(self.cells[y * self.width + x] & flag)
+
+    def set(self, x, y, flag):
+        self.cells[y * self.width + x] |= flag
+
+    def clear(self, x, y, flag):
+        self.cells[y * self.width + x] &= ~flag
+
+    def neighbor_mask(self, x, y, flag):
+        # which of the four neighbours have flag, as bits (top = 1, right = 2, bottom = 4, left = 8)
+        return (self.has(x, y - 1, flag)
+            | self.has(x + 1, y, flag) << 1
+            | self.has(x, y + 1, flag) << 2
+            | self.has(x - 1, y, flag) << 3)
+
+    # whole field operations
+    def positions(self, mask, value = None):
+        # (x, y) of every cell whose masked flags equal value (all of mask by default)
+        value = mask if value is None else value
+        table = translate_table(('match', mask, value), lambda cell: 1 if cell & mask == value else 0)
+        matches = self.cells.tobytes().translate(table)
+        return [divmod(match.start(), self.width)[::-1] for match in re.finditer(b'\x01', matches)]
+
+    def count(self, mask, value = None):
+        value = mask if value is None else value
+        table = translate_table(('match', mask, value), lambda cell: 1 if cell & mask == value else 0)
+        return self.cells.tobytes().translate(table).count(1)
+
+    def mark_all(self, flag, where):
+        # add flag to every cell that has all the flags in where, returns the cells that did not have it yet
+        changed = self.positions(where | flag, where)
+        table = translate_table(('mark', flag, where), lambda cell: cell | flag if cell & where == where else cell)
+        # written back in place so cell/row views stay valid
+        memoryview(self.cells)[:] = self.cells.tobytes().translate(table)
+        return changed
+
+    def clear_all(self, flag):
+        table = translate_table(('clear', flag), lambda cell: cell & ~flag)
+        # written back in place so cell/row views stay valid
+        memoryview(self.cells)[:] = self.cells.tobytes().translate(table)
+
+    def tobytes(self):
+        return self.cells.tobytes()
@@ -0,0 +1,106 @@
+import os
+import sys
+# the dummy drivers let the game run without a window or a sound card (e.g. on a CI box)
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+# pygame's import banner would end up in the --json output
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import argparse
+import json
+import random
+import time
+from os.path import abspath, dirname
+import pygame
+from settings import *
+from controls import ScriptedControls
+
+# every asset path is relative to the project root
+ROOT = dirname(dirname(abspath(__file__)))
+
+# a loop of walking around and using tools/seeds, used when no script file is given
+DEFAULT_SCRIPT = [
+    (0.0, 'right', True), (1.0, 'right', False),
+    (1.1, 'space', True), (1.2, 'space', False),
+    (1.6, 'down', True), (2.6, 'down', False),
+    (2.7, 'q', True), (2.8, 'q', False),
+    (2.9, 'space', True), (3.0, 'space', False),
+    (3.4, 'left', True), (4.4, 'left', False),
+    (4.5, 'e', True), (4.6, 'e', False),
+    (4.7, 'left ctrl', True), (4.8, 'left ctrl', False),
+    (5.2, 'up', True), (6.2, 'up', False),
+    (6.3, 'space', True), (6.4, 'space', False),
+    (7.0, 'up', False)
+]
+
+def init_display():
+    # the level reads the display surface when it is built, so the (dummy) window has to exist first
+    if not pygame.display.get_surface():
+        pygame.init()
+        pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+
+def create_level(controls = None):
+    from level import Level
+    os.chdir(ROOT)
+    init_display()
+    # headless runs never read or write the save files
+    return Level(controls, save_dir = None)
+
+def run_days(level, days, day_length, step, render = False):
+    # plays day_length seconds of every day, then sends the player to bed and waits for the next morning
+    ticks = 0
+    for _ in range(days):
+        for _ in range(round(day_length / step)):
+            level.update(step)
+            if render:
+                level.draw()
+            ticks += 1
+
+        level.player.sleep = True
+        while level.player.sleep:
+            level.update(step)
+            if render:
+                level.draw()
+            ticks += 1
+    return ticks
+
+def main(args = None):
+    parser = argparse.ArgumentParser(description = 'Run the game without a window and report simulation throughput.')
+    parser.add_argument('--days', type = int, default = 3)
+    parser.add_argument('--day-length', type = float, default = 120, help = 'simulated seconds before the player goes to bed')
+    parser.add_argument('--rate', type = int, default = SIMULATION_RATE, help = 'simulation steps per simulated second')
+    parser.add_argument('--script', help = 'json key timeline [[time, key name, pressed], ...] to replay')
+    parser.add_argument('--render', action = 'store_true', help = 'also draw every tick')
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--json', action = 'store_true', help = 'print the result as json')
+    args = parser.parse_args(args)
+
+    random.seed(args.seed)
+    # pygame is running before anything touches key codes, so --json output stays clean
+    init_display()
+    script = ScriptedControls.from_file(args.script, loop = True) if args.script else ScriptedControls(DEFAULT_SCRIPT, loop = True)
+    level = create_level(script)
+
+    start = time.perf_counter()
+    ticks = run_days(level, args.days, args.day_length, 1 / args.rate, args.render)
+    elapsed = time.perf_counter() - start
+
+    result = {
+        'days': args.days,
+        'ticks': ticks,
+        'seconds': round(elapsed, 4),
+        'ticks_per_second': round(ticks / elapsed, 1),
+        'render': args.render,
+        'money': level.player.money,
+        'items': level.player.item_inventory
+    }
+    if args.json:
+        print(json.dumps(result))
+    else:
+        print(f"{ticks} ticks over {args.days} days in {elapsed:.2f}s -> {result['ticks_per_second']} ticks/sec")
+    pygame.quit()
+    return result
+
+if __name__ == '__main__':
+    main()
+    sys.exit()
@@ -2,26 +2,40 @@ import pygame
 from settings import *
 from player import Player
 from overlay import Overlay
-from sprites import Generic, Water, WildFlower, Tree, Interaction, Particle
+from sprites import Generic, WildFlower, Tree, Interaction, ParticleManager
 from os.path import join
-from pytmx.util_pygame import load_pygame
+from tilemap import load_map
 from support import *
 from transition import Transition
 from soil import SoilLayer
 from sky import Rain, Sky
-from random import randint
+from random import randint, choices
 from menu import Menu
+from spatial import SpatialHash, SpatialGroup
+from baker import StaticBaker
+from lighting import Lighting
+from controls import Controls
+from profiler import profiler
+from timers import scheduler
+from animation import clock
+from save import SaveGame
 
 class Level:
-	def __init__(self):
+	def __init__(self, controls = None, save_dir = SAVE_DIR):
 		# get the display surface
 		self.display_surface = pygame.display.get_surface()
 
+		# input actions for the player and the menu, fed with keyboard events unless a script is given
+		self.controls = controls or Controls()
+
 		# add sprites into the custom groups made below
 		self.all_sprites = CameraGroup()
-		self.collision_sprites = pygame.sprite.Group()
-		self.tree_sprites = pygame.sprite.Group()
-		self.interaction_sprites = pygame.sprite.Group()
+		self.collision_sprites = SpatialGroup()
+		# trees and the bed/trader zones are indexed by tile, so the player only looks at the ones around it
+		self.tree_sprites = SpatialGroup()
+		self.interaction_sprites = SpatialGroup()
+		# pooled flashes for chopping and harvesting
+		self.particles = ParticleManager(self.all_sprites)
 
 		# soil setup
 		self.soil_layer = SoilLayer(self.all_sprites, self.collision_sprites)
@@ -30,68 +44,100 @@ class Level:
 		self.overlay = Overlay(self.player)
 
 		# day/night setup
-		self.transition = Transition(self.reset, self.player)
+		self.lighting = Lighting()
+		self.transition = Transition(self.reset, self.player, self.lighting)
 
 		# sky/rain setup
 		self.rain = Rain(self.all_sprites)
-		self.raining = randint(0, 10) > 7
-		self.soil_layer.raining = self.raining
-		self.sky = Sky()
+		self.set_raining(randint(0, 10) > 7)
+		self.sky = Sky(self.lighting)
 
 		# trading setup
 		self.shop_active = False
-		self.menu = Menu(self.player, self.toggle_shop)
+		self.shop_drawn = False
+		# only redraw the parts of the screen that changed while the camera stands still
+		self.dirty_rects = DIRTY_RECTS
+		self.menu = Menu(self.player, self.toggle_shop, self.controls)
 
 		# game sounds
-		self.success = pygame.mixer.Sound(join("audio", "success.wav"))
+		self.success = assets.sound(join("audio", "success.wav"))
 		self.success.set_volume(0.2)
 
-		self.music = pygame.mixer.Sound(join("audio", "music.mp3"))
+		self.music = assets.sound(join("audio", "music.mp3"))
 		self.music.set_volume(0.05)
 		self.music.play(loops = -1)
+
+		# continue the saved farm, then keep autosaving (None runs without saves, e.g. headless)
+		self.save_game = SaveGame(save_dir) if save_dir else None
+		if self.save_game:
+			self.save_game.load(self)
+			scheduler.call_later(AUTOSAVE_INTERVAL, self.autosave)
+
+	def autosave(self):
+		self.save()
+		scheduler.call_later(AUTOSAVE_INTERVAL, self.autosave)
+
+	def save(self):
+		# only the sections that changed since the last save are written, in the background
+		if self.save_game:
+			self.save_game.save(self)
+
+	def set_raining(self, raining):
+		self.raining = raining
+		self.soil_layer.raining = raining
+		self.rain.raining = raining
 		
 	def setup(self):
 		# loading pytmx level map and building the map objects based on layer
-		tmx_data = load_pygame(join("data", "map.tmx"))
+		tmx_data = load_map()
 		
+		# static tiles are composed into a few large chunk surfaces instead of one sprite per tile
+		baker = StaticBaker()
+
 		# building house floor
 		for layer in ['HouseFloor', 'HouseFurnitureBottom']:
-			for x, y, surf in tmx_data.get_layer_by_name(layer).tiles():
-				Generic((x * TILE_SIZE,y * TILE_SIZE), surf, self.all_sprites, LAYERS['house bottom'])
+			for x, y, surf in tmx_data.tiles(layer):
+				baker.add((x * TILE_SIZE,y * TILE_SIZE), surf, LAYERS['house bottom'])
 
 		# building house walls
 		for layer in ['HouseWalls', 'HouseFurnitureTop']:
-			for x, y, surf in tmx_data.get_layer_by_name(layer).tiles():
-				Generic((x * TILE_SIZE,y * TILE_SIZE), surf, self.all_sprites)
+			for x, y, surf in tmx_data.tiles(layer):
+				baker.add((x * TILE_SIZE,y * TILE_SIZE), surf, LAYERS['main'])
 
 		# building fence
-		for x, y, surf in tmx_data.get_layer_by_name('Fence').tiles():
-			Generic((x * TILE_SIZE,y * TILE_SIZE), surf, [self.all_sprites, self.collision_sprites])
-		
-		# building water
-		water_frames = import_folder(join("graphics", "water"))
-		for x, y, surf in tmx_data.get_layer_by_name('Water').tiles():
-			Water((x * TILE_SIZE,y * TILE_SIZE), water_frames, self.all_sprites)
+		for x, y, surf in tmx_data.tiles('Fence'):
+			baker.add((x * TILE_SIZE,y * TILE_SIZE), surf, LAYERS['main'])
+			# the fence is drawn from the baked chunks, this invisible copy only handles collision
+			Generic((x * TILE_SIZE,y * TILE_SIZE), surf, self.collision_sprites)
+
+		# building water, every water tile plays the one shared water animation so the water is baked into animated chunks
+		water_animation = clock.animation('water', import_folder(join("graphics", "water")), 5)
+		for x, y, surf in tmx_data.tiles('Water'):
+			baker.add_animated((x * TILE_SIZE,y * TILE_SIZE), water_animation, LAYERS['water'])
+
+		baker.bake(self.all_sprites)
 
 		# building trees
-		for obj in tmx_data.get_layer_by_name('Trees'):
+		for obj in tmx_data.objects('Trees'):
 			Tree(
 				pos = (obj.x, obj.y), 
 				surf = obj.image, 
 				groups = [self.all_sprites, self.collision_sprites, self.tree_sprites], name = obj.name,
-				player_add = self.player_add)
+				player_add = self.player_add,
+				particles = self.particles,
+				all_sprites = self.all_sprites)
 
 		# building flowers
-		for obj in tmx_data.get_layer_by_name('Decoration'):
+		for obj in tmx_data.objects('Decoration'):
 			WildFlower((obj.x, obj.y), obj.image, [self.all_sprites, self.collision_sprites])
 
 		# collision tiles for walls/water
-		for x, y, surf in tmx_data.get_layer_by_name('Collision').tiles():
+		for x, y, surf in tmx_data.tiles('Collision'):
 			# only place in collision_sprites so it is not drawn but still exists
 			Generic((x * TILE_SIZE,y * TILE_SIZE), pygame.Surface((TILE_SIZE, TILE_SIZE)), self.collision_sprites)
 
 		# creating the player layer
-		for obj in tmx_data.get_layer_by_name('Player'):
+		for obj in tmx_data.objects('Player'):
 			if obj.name == 'Start':
 				self.player = Player(
 					pos = (obj.x, obj.y), 
@@ -100,7 +146,9 @@ class Level:
 					tree_sprites = self.tree_sprites,
 					interaction = self.interaction_sprites,
 					soil_layer = self.soil_layer,
-					toggle_shop = self.toggle_shop)
+					toggle_shop = self.toggle_shop,
+					controls = self.controls)
+				self.all_sprites.track(self.player)
 
 			# check if the player is on the Bed tile to allow sleeping
 			if obj.name == 'Bed':
@@ -123,7 +171,7 @@ class Level:
 		# creating the floor
 		Generic(
 			pos = (0,0), 
-			surf = pygame.image.load(join("graphics", "world") + "\ground.png").convert_alpha(),
+			surf = assets.image(join("graphics", "world", "ground.png")),
 			groups = self.all_sprites,
 			z = LAYERS['ground']
 		)
@@ -143,60 +191,111 @@ class Level:
 		self.soil_layer.remove_water()
 
 		# rest the rain state
-		self.raining = randint(0, 10) > 7
-		self.soil_layer.raining = self.raining
+		self.set_raining(randint(0, 10) > 7)
 		if self.raining:
 			self.soil_layer.water_all()
 
-		# reset apples on trees
-		for tree in self.tree_sprites.sprites():
-			# remove all existing apples for every tree then create new
-			for apple in tree.apple_sprites.sprites():
-				apple.kill()
-			tree.create_fruit()
+		# reset apples on trees, one random draw covers every apple position on the map
+		trees = self.tree_sprites.sprites()
+		grows = choices((True, False), weights = (2, 9), k = sum(len(tree.apples) for tree in trees))
+		start = 0
+		for tree in trees:
+			end = start + len(tree.apples)
+			tree.set_fruit(grows[start:end])
+			start = end
 
 		# reset sky transition when sleeping
 		self.sky.start_color = [255, 255, 255]
 
+		# save every night
+		self.save()
+
 	def plant_collision(self):
-		if self.soil_layer.plant_sprites:
-			for plant in self.soil_layer.plant_sprites.sprites():
-				if plant.harvestable and plant.rect.colliderect(self.player.hitbox):
-					# update player inventory and remove plant
-					self.player_add(plant.plant_type)
-					plant.kill()
+		# only the grown plants around the player can be harvested
+		for plant in self.soil_layer.harvestable_near(self.player.hitbox):
+			if plant.rect.colliderect(self.player.hitbox):
+				# update player inventory and remove plant
+				self.player_add(plant.plant_type)
+				self.soil_layer.remove_plant(plant)
 
-					# create a particle animation for removing the plant
-					Particle(plant.rect.topleft, plant.image, self.all_sprites, z = LAYERS['main'])
+				# create a particle animation for removing the plant
+				self.particles.spawn(plant.rect.topleft, plant.image, z = LAYERS['main'])
 
-					# remove the 'P' from the soil dict grid
-					self.soil_layer.grid[plant.rect.centery // TILE_SIZE][plant.rect.centerx // TILE_SIZE].remove('P')
+	# advances the simulation by dt seconds without drawing anything
+	def update(self, dt):
+		self.controls.update(dt)
 
-	def run(self, dt):
-		
-		# drawing objects
-		self.display_surface.fill('black')
-		self.all_sprites.custom_draw(self.player)
-
-		# update logic
 		# if the player is shopping no need to update sprites/collision
 		if self.shop_active:
-			self.menu.update()
-		else:			
-			self.all_sprites.update(dt)
-			self.plant_collision()
+			with profiler.scope('menu'):
+				self.menu.input()
+			# the player is not updated, so there is nothing to interpolate between
+			self.player.previous_center.update(self.player.rect.center)
+		else:
+			with profiler.scope('update'):
+				# timers and lifetimes run on simulation time, so they pause with the game while shopping
+				scheduler.update(dt)
+				# shared animations (e.g. the water) move once per step, however many sprites show them
+				clock.update(dt)
+				self.all_sprites.update(dt)
+			with profiler.scope('plant collision'):
+				self.plant_collision()
 
 		# weather/rain updates
-		self.overlay.display()
-		if self.raining and not self.shop_active:
-			self.rain.update()
+		if not self.shop_active:
+			with profiler.scope('rain'):
+				self.rain.update(dt)
 
 		# daytime transition
-		self.sky.display(dt)
+		with profiler.scope('sky'):
+			self.sky.update(dt)
 
 		# day/night system transition when sleeping
 		if self.player.sleep:
-			self.transition.play()
+			with profiler.scope('transition'):
+				self.transition.update(dt)
+
+	# draws the current state, alpha is how far the frame is between the last two simulation steps
+	# returns the screen areas that were drawn, None when it was the whole screen
+	def draw(self, alpha = 1):
+		# the sky and the sleep transition only set this frame's tint, the screen is tinted in one pass at the end
+		with profiler.scope('sky'):
+			self.sky.display()
+			if self.player.sleep:
+				self.transition.display()
+
+		dirty = None
+		if self.dirty_rects:
+			# the ui areas that change this frame
+			dirty = self.overlay.refresh()
+			if self.shop_active:
+				dirty += self.menu.refresh()
+			# anything that changes the whole screen needs a full frame
+			if self.lighting.changed() or self.player.sleep or profiler.show_hud or self.shop_active != self.shop_drawn:
+				self.all_sprites.invalidate()
+			self.shop_drawn = self.shop_active
+
+		# drawing objects
+		with profiler.scope('draw'):
+			rects = self.all_sprites.custom_draw(self.player, alpha, dirty)
+
+		# the ui is drawn over every area the world was drawn in
+		for rect in [None] if rects is None else rects:
+			self.display_surface.set_clip(rect)
+			if self.shop_active:
+				with profiler.scope('menu'):
+					self.menu.display()
+			with profiler.scope('overlay'):
+				self.overlay.display()
+		self.display_surface.set_clip(None)
+
+		with profiler.scope('sky'):
+			self.lighting.apply(rects)
+		return rects
+
+	def run(self, dt):
+		self.update(dt)
+		return self.draw()
 
 # creating a special group to put all the sprites in
 class CameraGroup(pygame.sprite.Group):
@@ -208,24 +307,205 @@ class CameraGroup(pygame.sprite.Group):
 		# the offset adjusts the position of the world based on player movement
 		self.offset = pygame.math.Vector2()
 
-	def custom_draw(self, player):
+		# render queue: a spatial hash of map chunks per layer so only chunks on screen are drawn
+		self.layers = {layer: SpatialHash(CHUNK_SIZE) for layer in LAYERS.values()}
+		# and every sprite of a layer in y order, the lists persist between frames so sorting them is a near linear pass
+		self.ordered = {layer: [] for layer in LAYERS.values()}
+		# lists holding sprites that have since been removed or moved to another layer, cleaned up on the next draw
+		self.stale_layers = set()
+		# the layer each sprite is currently filed under and the rect it was indexed with
+		self.sprite_layers = {}
+		self.sprite_rects = {}
+		# sprites are added before their z is set, so they are filed on the next update/draw
+		self.pending = []
+		# sprites that move on their own (e.g. the player) are checked every update, any other sprite calls refresh when it changes
+		self.movers = {}
+		# layer -> functions drawing non sprite content (e.g. particle pools) in that layer's slot
+		self.renderers = {layer: [] for layer in LAYERS.values()}
+
+		# dirty rect rendering: what every visible sprite looked like and where it was on the screen last frame,
+		# the camera offset it was drawn with (None forces a full frame) and the areas the renderers covered
+		self.drawn = {}
+		self.drawn_offset = None
+		self.renderer_rects = []
+
+	def add_internal(self, sprite, layer = None):
+		super().add_internal(sprite)
+		self.pending.append(sprite)
+
+	def remove_internal(self, sprite):
+		super().remove_internal(sprite)
+		self.movers.pop(sprite, None)
+		layer = self.sprite_layers.pop(sprite, None)
+		if layer is not None:
+			self.layers[layer].remove(sprite)
+			del self.sprite_rects[sprite]
+			self.stale_layers.add(layer)
+
+	def add_renderer(self, layer, renderer, bounds = None):
+		# renderer(surface, offset, screen_rect) is called right after the sprites of the layer are drawn
+		# bounds(offset, screen_rect) returns the screen areas it is going to draw, without it every frame is a full frame
+		self.renderers[layer].append((renderer, bounds))
+
+	def track(self, sprite):
+		self.movers[sprite] = None
+
+	def refresh(self, sprite):
+		# re-file a sprite after its rect or layer changed (sprites still pending are filed with their new values anyway)
+		if sprite in self.sprite_layers:
+			self.file(sprite)
+
+	def invalidate(self):
+		# the next frame is drawn in full
+		self.drawn_offset = None
+
+	def file_pending(self):
+		for sprite in self.pending:
+			# skip sprites that were killed before ever being drawn or are already filed
+			if sprite in self.spritedict and sprite not in self.sprite_layers:
+				self.file(sprite)
+		self.pending.clear()
+
+	def file(self, sprite):
+		# (re)index a sprite in the chunks of its current layer
+		layer = self.sprite_layers.get(sprite)
+		if layer != sprite.z:
+			if layer is not None:
+				self.layers[layer].remove(sprite)
+				self.stale_layers.add(layer)
+			self.ordered[sprite.z].append(sprite)
+
+		self.sprite_layers[sprite] = sprite.z
+		self.sprite_rects[sprite] = sprite.rect.copy()
+		self.layers[sprite.z].move(sprite, sprite.rect)
+
+	def update(self, dt):
+		super().update(dt)
+		self.file_pending()
+
+		# keep the chunks in sync with the moving sprites, only they are checked
+		for sprite in self.movers:
+			if sprite in self.sprite_layers and (sprite.z != self.sprite_layers[sprite] or sprite.rect != self.sprite_rects[sprite]):
+				self.file(sprite)
+
+	# dirty is None to draw the whole screen, or the ui areas that changed to only draw the parts of the screen that changed
+	# returns those parts, None when the whole screen was drawn
+	def custom_draw(self, player, alpha = 1, dirty = None):
+		# the player (and the camera following it) is drawn between its last two simulation positions
+		center = player.previous_center.lerp(player.rect.center, alpha)
+		player_shift = center - player.rect.center
+
 		# offset is how much every sprite will be shifted relative to player
-		self.offset.x = player.rect.centerx - SCREEN_WIDTH / 2
-		self.offset.y = player.rect.centery - SCREEN_HEIGHT / 2
-
-		for layer in LAYERS.values():
-			# sort the sprites based on Y position to always draw sprites behind the player before the player sprite to simulate 3d overlapping sprites
-			for sprite in sorted(self.sprites(), key = lambda sprite: sprite.rect.centery):
-				# only draw the sprites in the correct layer order
-				if sprite.z == layer:
-					offset_rect = sprite.rect.copy()
-					offset_rect.center -= self.offset
-					self.display_surface.blit(sprite.image, offset_rect)
-					# # anaytics
-					# if sprite == player:
-					# 	pygame.draw.rect(self.display_surface,'red',offset_rect,5)
-					# 	hitbox_rect = player.hitbox.copy()
-					# 	hitbox_rect.center = offset_rect.center
-					# 	pygame.draw.rect(self.display_surface,'green',hitbox_rect,5)
-					# 	target_pos = offset_rect.center + PLAYER_TOOL_OFFSET[player.status.split('_')[0]]
-					# 	pygame.draw.circle(self.display_surface,'blue',target_pos,5)
+		self.offset.x = center.x - SCREEN_WIDTH / 2
+		self.offset.y = center.y - SCREEN_HEIGHT / 2
+		screen_rect = pygame.Rect(round(self.offset.x), round(self.offset.y), SCREEN_WIDTH, SCREEN_HEIGHT)
+
+		self.file_pending()
+
+		# sort the sprites based on Y position to always draw sprites behind the player before the player sprite to simulate 3d overlapping sprites
+		# the lists keep their order between frames so this is almost always a single pass, then only sprites in the chunks overlapping the screen are drawn
+		visible = []
+		for layer, chunks in self.layers.items():
+			ordered = self.ordered[layer]
+			if layer in self.stale_layers:
+				# a sprite removed and added again (e.g. a pooled apple) is listed twice, only one entry is kept
+				ordered[:] = [sprite for sprite in dict.fromkeys(ordered) if self.sprite_layers.get(sprite) == layer]
+			ordered.sort(key = lambda sprite: sprite.rect.centery)
+			on_screen = chunks.query(screen_rect)
+			visible.append((layer, [sprite for sprite in ordered if sprite in on_screen]))
+		self.stale_layers.clear()
+		positions = {sprite: sprite.rect.topleft - self.offset + (player_shift if sprite is player else (0, 0))
+			for layer, sprites in visible for sprite in sprites}
+
+		rects = None
+		if dirty is not None:
+			rects = self.changed_rects(positions, dirty, screen_rect)
+		else:
+			self.drawn_offset = None
+
+		for rect in [self.display_surface.get_rect()] if rects is None else rects:
+			self.display_surface.set_clip(rect)
+			self.display_surface.fill('black', rect)
+			self.draw_area(visible, positions, player, rect if rects is not None else None)
+		self.display_surface.set_clip(None)
+		return rects
+
+	def changed_rects(self, positions, dirty, screen_rect):
+		drawn = {sprite: (sprite.image, sprite.image.get_rect(topleft = pos).inflate(2, 2)) for sprite, pos in positions.items()}
+		renderer_rects = []
+		for renderers in self.renderers.values():
+			for renderer, bounds in renderers:
+				if bounds is None:
+					self.invalidate()
+				else:
+					renderer_rects += bounds(self.offset, screen_rect)
+
+		offset = tuple(self.offset)
+		rects = None
+		if offset == self.drawn_offset:
+			# sprites that appeared, moved, changed image or went away, and everything the renderers covered now and last frame
+			rects = list(dirty) + self.renderer_rects + renderer_rects
+			previous = self.drawn
+			for sprite, (image, rect) in drawn.items():
+				last = previous.pop(sprite, None)
+				if last is None:
+					rects.append(rect)
+				elif last[1] != rect:
+					rects += (last[1], rect)
+				elif last[0] is not image:
+					rects.append(rect)
+			rects += (rect for image, rect in previous.values())
+			rects = self.merge_rects(rects)
+
+		self.drawn = drawn
+		self.drawn_offset = offset
+		self.renderer_rects = renderer_rects
+		return rects
+
+	def merge_rects(self, rects):
+		screen = self.display_surface.get_rect()
+		rects = [rect.clip(screen) for rect in rects]
+		rects = [rect for rect in rects if rect.width and rect.height]
+		if len(rects) > DIRTY_RECT_LIMIT * 4:
+			rects = [rects[0].unionall(rects[1:])]
+
+		# overlapping areas are joined, every pixel has to be drawn (and tinted) exactly once
+		merged = []
+		for rect in rects:
+			index = rect.collidelist(merged)
+			while index >= 0:
+				rect = rect.union(merged.pop(index))
+				index = rect.collidelist(merged)
+			merged.append(rect)
+
+		if len(merged) > DIRTY_RECT_LIMIT:
+			merged = [merged[0].unionall(merged[1:])]
+		# past a point one full frame is cheaper than many small ones
+		if sum(rect.width * rect.height for rect in merged) > screen.width * screen.height * DIRTY_AREA_LIMIT:
+			return None
+		return merged
+
+	# draws every layer into area of the screen (None for all of it)
+	def draw_area(self, visible, positions, player, area):
+		world_rect = pygame.Rect(round(self.offset.x), round(self.offset.y), SCREEN_WIDTH, SCREEN_HEIGHT)
+		if area:
+			world_rect = area.move(world_rect.topleft)
+
+		for layer, sprites in visible:
+			for sprite in sprites:
+				if area and not area.colliderect(self.drawn[sprite][1]):
+					continue
+				self.display_surface.blit(sprite.image, positions[sprite])
+				# # anaytics
+				# if sprite == player:
+				# 	offset_rect = sprite.rect.copy()
+				# 	offset_rect.center -= self.offset
+				# 	pygame.draw.rect(self.display_surface,'red',offset_rect,5)
+				# 	hitbox_rect = player.hitbox.copy()
+				# 	hitbox_rect.center = offset_rect.center
+				# 	pygame.draw.rect(self.display_surface,'green',hitbox_rect,5)
+				# 	target_pos = offset_rect.center + PLAYER_TOOL_OFFSET[player.status.split('_')[0]]
+				# 	pygame.draw.circle(self.display_surface,'blue',target_pos,5)
+
+			for renderer, bounds in self.renderers[layer]:
+				renderer(self.display_surface, self.offset, world_rect)
@@ -0,0 +1,46 @@
+import pygame
+
+# a single tint pass at the end of the frame that combines the sky colour and the sleep transition
+class Lighting:
+    def __init__(self):
+        self.display_surface = pygame.display.get_surface()
+        self.color = (255, 255, 255)
+        # the tint of the last frame, a different tint changes every pixel on the screen
+        self.applied = (255, 255, 255)
+
+        # a full screen surface of the tint colour, only filled again when the colour changes
+        self.tint_surf = pygame.Surface(self.display_surface.get_size())
+        self.tint_color = None
+
+    def tint(self, color):
+        # multiply another tint into this frame's colour instead of darkening the screen twice
+        self.color = tuple(channel * value / 255 for channel, value in zip(self.color, color))
+
+    def quantized(self):
+        # quantize to whole colour values, that is all the screen can show anyway
+        return tuple(int(channel) for channel in self.color)
+
+    def changed(self):
+        return self.quantized() != self.applied
+
+    # rects limits the pass to the parts of the screen that were drawn again
+    def apply(self, rects = None):
+        color = self.quantized()
+        self.color = (255, 255, 255)
+        self.applied = color
+
+        # full daylight multiplies every pixel by 1, so the pass is skipped entirely
+        if color == (255, 255, 255):
+            return
+
+        # the sky changes colour every few frames at most, so the overlay is usually blitted as it is
+        # (a multiplying blit of a surface is much faster than a multiplying fill of the screen)
+        if color != self.tint_color:
+            self.tint_surf.fill(color)
+            self.tint_color = color
+
+        if rects is None:
+            self.display_surface.blit(self.tint_surf, (0, 0), special_flags = pygame.BLEND_RGB_MULT)
+        else:
+            for rect in rects:
+                self.display_surface.blit(self.tint_surf, rect, rect, special_flags = pygame.BLEND_RGB_MULT)
@@ -1,25 +1,69 @@
 import pygame, sys
 from settings import *
 from level import Level
+from profiler import profiler
 
 class Game:
 	def __init__(self):
 		pygame.init()
-		self.screen = pygame.display.set_mode((SCREEN_WIDTH,SCREEN_HEIGHT))
+		# vsync is only available for scaled/opengl windows
+		flags = pygame.SCALED if VSYNC else 0
+		self.screen = pygame.display.set_mode((SCREEN_WIDTH,SCREEN_HEIGHT), flags, vsync = int(VSYNC))
 		pygame.display.set_caption('Sprout Farms')
 		self.clock = pygame.time.Clock()
 		self.level = Level()
 
+		# fixed timestep setup
+		self.step = 1 / SIMULATION_RATE
+		self.accumulator = 0
+
 	def run(self):
 		while True:
 			for event in pygame.event.get():
 				if event.type == pygame.QUIT:
+					# save the farm before closing
+					self.level.save()
+					if self.level.save_game:
+						self.level.save_game.flush()
 					pygame.quit()
 					sys.exit()
+				self.level.controls.handle_event(event)
+				# profiler hud and trace recording
+				if event.type == pygame.KEYDOWN and event.key == pygame.key.key_code(PROFILER_HUD_KEY):
+					profiler.toggle_hud()
+					# the hud is drawn over the whole screen, so is the frame that removes it
+					self.level.all_sprites.invalidate()
+				if event.type == pygame.KEYDOWN and event.key == pygame.key.key_code(PROFILER_TRACE_KEY):
+					profiler.toggle_trace()
   
-			dt = self.clock.tick() / 1000
-			self.level.run(dt)
-			pygame.display.update()
+			dt = self.clock.tick(FPS) / 1000
+			profiler.begin_frame()
+			if FIXED_TIMESTEP:
+				rects = self.simulate(dt)
+			else:
+				rects = self.level.run(dt)
+			profiler.end_frame()
+			profiler.display(self.screen, self.level)
+			# in dirty rect mode only the parts of the screen that changed are presented
+			if rects is None or profiler.show_hud:
+				pygame.display.update()
+			else:
+				pygame.display.update(rects)
+
+	def simulate(self, dt):
+		# run as many fixed simulation steps as the elapsed time covers
+		self.accumulator += dt
+		steps = 0
+		while self.accumulator >= self.step and steps < MAX_SIMULATION_STEPS:
+			self.level.update(self.step)
+			self.accumulator -= self.step
+			steps += 1
+
+		# too far behind (e.g. the window was dragged), drop the backlog instead of spiralling
+		if self.accumulator >= self.step:
+			self.accumulator %= self.step
+
+		return self.level.draw(self.accumulator / self.step)
 
 if __name__ == '__main__':
 	game = Game()
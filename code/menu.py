@@ -1,13 +1,13 @@
 import pygame
 from settings import *
 from os.path import join
-from timers import Timer
 
 class Menu:
-    def __init__(self, player, toggle_menu):
+    def __init__(self, player, toggle_menu, controls):
         # basic setup
         self.player = player
         self.toggle_menu = toggle_menu
+        self.controls = controls
         self.display_surface = pygame.display.get_surface()
         self.font = pygame.font.Font(join("font", "LycheeSoda.ttf"), 30)
 
@@ -25,15 +25,24 @@ class Menu:
 
         # menu navigation
         self.index = 0
-        self.timer = Timer(200)
 
 
-    def display_money(self):
-        text_surf = self.font.render(f'${self.player.money}', False, 'Black')
-        text_rect = text_surf.get_rect(midbottom = (SCREEN_WIDTH / 2, SCREEN_HEIGHT - 20))
+    # renders the money box again when the amount changed, returns the screen areas that changed
+    def refresh_money(self):
+        if self.money == self.player.money:
+            return []
+
+        previous = self.money_rect
+        self.money = self.player.money
+        text_surf = self.font.render(f'${self.money}', False, 'Black')
+        self.money_surf = pygame.Surface(text_surf.get_rect().inflate(10, 10).size, pygame.SRCALPHA)
+        pygame.draw.rect(self.money_surf, 'White', self.money_surf.get_rect(), 0, 4)
+        self.money_surf.blit(text_surf, (5, 5))
+        self.money_rect = self.money_surf.get_rect(midbottom = (SCREEN_WIDTH / 2, SCREEN_HEIGHT - 15))
+        return [rect for rect in (previous, self.money_rect) if rect]
 
-        pygame.draw.rect(self.display_surface, 'White', text_rect.inflate(10, 10), 0, 4)
-        self.display_surface.blit(text_surf, text_rect)
+    def display_money(self):
+        self.display_surface.blit(self.money_surf, self.money_rect)
 
     def setup(self):
         # creating the text surfaces
@@ -54,40 +63,59 @@ class Menu:
         self.buy_text = self.font.render('buy', False, 'Black')
         self.sell_text = self.font.render('sell', False, 'Black')
 
+        # retained rendering: the rows are drawn into one panel surface, a row is only drawn again
+        # when its amount or selection changes, so the open shop costs two blits a frame
+        self.panel = pygame.Surface(self.main_rect.size, pygame.SRCALPHA)
+        self.row_rects = []
+        top = 0
+        for text_surf in self.text_surfs:
+            self.row_rects.append(pygame.Rect(0, top, self.width, text_surf.get_height() + (self.padding * 2)))
+            top += text_surf.get_height() + (self.padding * 2) + self.space
+        # (amount, selected) each row was last drawn with
+        self.row_states = [None] * len(self.options)
+        # amount -> rendered number, shared by all rows
+        self.number_surfs = {}
+        self.money = None
+        self.money_rect = None
+
+    def number_surf(self, amount):
+        if amount not in self.number_surfs:
+            self.number_surfs[amount] = self.font.render(str(amount), False, 'Black')
+        return self.number_surfs[amount]
+
+    def amount(self, index):
+        item = self.options[index]
+        return self.player.item_inventory[item] if index <= self.sell_border else self.player.seed_inventory[item]
+
     def input(self):
-        keys = pygame.key.get_pressed()
-        self.timer.update()
+        # key repeat while holding up/down/select is handled by the controls
+        controls = self.controls
 
-        if keys[pygame.K_ESCAPE]:
+        if controls.pressed('menu close'):
             self.toggle_menu()
 
-        if not self.timer.active:
-            if keys[pygame.K_UP]:
-                self.index -= 1
-                self.timer.activate()
-
-            if keys[pygame.K_DOWN]:
-                self.index += 1
-                self.timer.activate()
-
-            if keys[pygame.K_SPACE]:
-                self.timer.activate()
-
-                # get the selected item
-                current_item = self.options[self.index]
-
-                # checking if selling or buying the item
-                if self.index <= self.sell_border:
-                    if self.player.item_inventory[current_item] > 0:
-                        self.player.item_inventory[current_item] -= 1
-                        self.player.money += SALE_PRICES[current_item]
-                    
-                # buying
-                else:
-                    seed_price = PURCHASE_PRICES[current_item]
-                    if self.player.money >= seed_price:
-                        self.player.seed_inventory[current_item] += 1
-                        self.player.money -= PURCHASE_PRICES[current_item]
+        if controls.pressed('menu up'):
+            self.index -= 1
+
+        if controls.pressed('menu down'):
+            self.index += 1
+
+        if controls.pressed('menu select'):
+            # get the selected item
+            current_item = self.options[self.index]
+
+            # checking if selling or buying the item
+            if self.index <= self.sell_border:
+                if self.player.item_inventory[current_item] > 0:
+                    self.player.item_inventory[current_item] -= 1
+                    self.player.money += SALE_PRICES[current_item]
+                
+            # buying
+            else:
+                seed_price = PURCHASE_PRICES[current_item]
+                if self.player.money >= seed_price:
+                    self.player.seed_inventory[current_item] += 1
+                    self.player.money -= PURCHASE_PRICES[current_item]
 
         # loop the index if user selects past the list of items
         if self.index < 0:
@@ -95,40 +123,45 @@ class Menu:
         if self.index > len(self.options) - 1:
             self.index = 0
 
-    def show_entry(self, text_surf, amount, top, selected):
-        # creating a background
-        bg_rect = pygame.Rect(self.main_rect.left, top, self.width, text_surf.get_height() + (self.padding * 2))
-        pygame.draw.rect(self.display_surface, 'White', bg_rect, 0, 4)
+    def show_entry(self, text_surf, amount, bg_rect, selected, index):
+        # clear the row (the gaps between rows stay see-through) and create a background
+        self.panel.fill((0, 0, 0, 0), bg_rect)
+        pygame.draw.rect(self.panel, 'White', bg_rect, 0, 4)
 
         # creating the item text
-        text_rect = text_surf.get_rect(midleft = (self.main_rect.left + 20, bg_rect.centery))
-        self.display_surface.blit(text_surf, text_rect)
+        text_rect = text_surf.get_rect(midleft = (20, bg_rect.centery))
+        self.panel.blit(text_surf, text_rect)
 
         # amount($) for each item
-        amount_surf = self.font.render(str(amount), False, 'Black')
-        amount_rect = amount_surf.get_rect(midright = (self.main_rect.right - 20, bg_rect.centery))
-        self.display_surface.blit(amount_surf, amount_rect)
+        amount_surf = self.number_surf(amount)
+        amount_rect = amount_surf.get_rect(midright = (self.width - 20, bg_rect.centery))
+        self.panel.blit(amount_surf, amount_rect)
 
         # draw a border and display buy/sell around selected item
         if selected:
-            pygame.draw.rect(self.display_surface, 'Black', bg_rect, 4, 4)
-            
+            pygame.draw.rect(self.panel, 'Black', bg_rect, 4, 4)
+
             # display sell or buy text depending on if pos before or after sell border
-            if self.index <= self.sell_border:
-                pos_rect = self.sell_text.get_rect(midleft = (self.main_rect.left + 150, bg_rect.centery))
-                self.display_surface.blit(self.sell_text, pos_rect)
+            if index <= self.sell_border:
+                pos_rect = self.sell_text.get_rect(midleft = (150, bg_rect.centery))
+                self.panel.blit(self.sell_text, pos_rect)
             else:
-                pos_rect = self.buy_text.get_rect(midleft = (self.main_rect.left + 150, bg_rect.centery))
-                self.display_surface.blit(self.buy_text, pos_rect)
+                pos_rect = self.buy_text.get_rect(midleft = (150, bg_rect.centery))
+                self.panel.blit(self.buy_text, pos_rect)
 
-    def update(self):
-        self.input()
-        self.display_money()
+    # draws the rows whose amount or selection changed into the panel, returns the screen areas that changed
+    def refresh(self):
+        rects = self.refresh_money()
 
         for text_index, text_surf in enumerate(self.text_surfs):
-            # get how far down the menu to display the text
-            top = self.main_rect.top + text_index * (text_surf.get_height() + (self.padding * 2) + self.space)
-            amount_list = list(self.player.item_inventory.values()) + list(self.player.seed_inventory.values())
-            amount = amount_list[text_index]
-
-            self.show_entry(text_surf, amount, top, self.index == text_index)
+            state = (self.amount(text_index), self.index == text_index)
+            if self.row_states[text_index] != state:
+                self.row_states[text_index] = state
+                self.show_entry(text_surf, state[0], self.row_rects[text_index], state[1], text_index)
+                rects.append(self.row_rects[text_index].move(self.main_rect.topleft))
+        return rects
+
+    def display(self):
+        self.refresh()
+        self.display_money()
+        self.display_surface.blit(self.panel, self.main_rect)
@@ -1,6 +1,7 @@
 import pygame
 from settings import *
 from os.path import join
+from support import assets
 
 class Overlay:
     def __init__(self, player):
@@ -9,11 +10,30 @@ class Overlay:
         self.player = player
 
         # surface image imports 
-        overlay_path = join("graphics", "overlay") + "\\"
-        self.tools_surf = {tool: pygame.image.load(f'{overlay_path}{tool}.png').convert_alpha() for tool in player.tools}
-        self.seeds_surf = {seed: pygame.image.load(f'{overlay_path}{seed}.png').convert_alpha() for seed in player.seeds}
+        self.tools_surf = {tool: assets.image(join("graphics", "overlay", f'{tool}.png')) for tool in player.tools}
+        self.seeds_surf = {seed: assets.image(join("graphics", "overlay", f'{seed}.png')) for seed in player.seeds}
+
+        # (tool, seed) shown last, to know when the icons have to be drawn again
+        self.selected = None
+
+    def icon_rects(self, tool, seed):
+        return [self.tools_surf[tool].get_rect(midbottom = OVERLAY_POSITIONS['tool']),
+                self.seeds_surf[seed].get_rect(midbottom = OVERLAY_POSITIONS['seed'])]
+
+    # the screen areas of the icons that changed since the last frame
+    def refresh(self):
+        selected = (self.player.selected_tool, self.player.selected_seed)
+        if selected == self.selected:
+            return []
+
+        rects = self.icon_rects(*selected)
+        if self.selected:
+            rects += self.icon_rects(*self.selected)
+        self.selected = selected
+        return rects
 
     def display(self):
+        self.selected = (self.player.selected_tool, self.player.selected_seed)
 
         # show tools
         tool_surf = self.tools_surf[self.player.selected_tool]
@@ -5,7 +5,7 @@ from timers import Timer
 from os.path import join
 
 class Player(pygame.sprite.Sprite):
-    def __init__(self, pos, group, collision_sprites, tree_sprites, interaction, soil_layer, toggle_shop):
+    def __init__(self, pos, group, collision_sprites, tree_sprites, interaction, soil_layer, toggle_shop, controls):
         super().__init__(group)
 
         self.import_assets()
@@ -24,6 +24,8 @@ class Player(pygame.sprite.Sprite):
         # movement variables setup
         self.direction = pygame.math.Vector2()
         self.pos = pygame.math.Vector2(self.rect.center)
+        # where the player was before the last update, used to interpolate between simulation steps
+        self.previous_center = pygame.math.Vector2(self.rect.center)
         self.speed = 200
 
         # collision
@@ -34,9 +36,7 @@ class Player(pygame.sprite.Sprite):
         # timers
         self.timers = {
             'tool use': Timer(350, self.use_tool),
-            'tool switch': Timer(200),
             'seed use': Timer(350, self.use_seed),
-            'seed switch': Timer(200),
         }
 
         # farming tools setup
@@ -71,8 +71,11 @@ class Player(pygame.sprite.Sprite):
         # soil setup
         self.soil_layer = soil_layer
 
+        # input actions (from keyboard events or a scripted timeline)
+        self.controls = controls
+
         # game sounds
-        self.watering = pygame.mixer.Sound(join("audio", "water.mp3"))
+        self.watering = assets.sound(join("audio", "water.mp3"))
         self.watering.set_volume(0.1)
 
     def use_tool(self):
@@ -80,7 +83,8 @@ class Player(pygame.sprite.Sprite):
             self.soil_layer.get_hit(self.target_pos)
 
         if self.selected_tool == 'axe':
-            for tree in self.tree_sprites.sprites():
+            # only the trees in the tiles around the target can be hit
+            for tree in list(self.tree_sprites.near(pygame.Rect(self.target_pos, (1, 1)))):
                 if tree.rect.collidepoint(self.target_pos):
                     tree.damage()
             
@@ -116,61 +120,59 @@ class Player(pygame.sprite.Sprite):
         self.image = self.animations[self.status][int(self.frame_index)]
 
     def input(self):
-        keys = pygame.key.get_pressed()
+        controls = self.controls
 
         if not self.timers['tool use'].active and not self.sleep:
             # direction inputs (Up/Left are negative directions)
-            if keys[pygame.K_UP]:
+            if controls.held('up'):
                 self.direction.y = -1
                 self.status = 'up'
-            elif keys[pygame.K_DOWN]:
+            elif controls.held('down'):
                 self.direction.y = 1
                 self.status = 'down'
             else:
                 self.direction.y = 0
 
-            if keys[pygame.K_RIGHT]:
+            if controls.held('right'):
                 self.direction.x = 1
                 self.status = 'right'
-            elif keys[pygame.K_LEFT]:
+            elif controls.held('left'):
                 self.direction.x = -1
                 self.status = 'left'
             else:
                 self.direction.x = 0
 
-            # tool use key
-            if keys[pygame.K_SPACE]:
+            # tool use key (holding it keeps using the tool)
+            if controls.held('use tool'):
                 # run timer for tool use
                 self.timers['tool use'].activate()
                 self.direction = pygame.math.Vector2()
                 self.frame_index = 0
 
-            # change tool
-            if keys[pygame.K_q] and not self.timers['tool switch'].active:
-                self.timers['tool switch'].activate()
+            # change tool (key repeat is handled by the controls)
+            if controls.pressed('switch tool'):
                 self.tool_index += 1
                 # if tool index > lenth of tools list => set to 0
                 self.tool_index = self.tool_index if self.tool_index < len(self.tools) else 0
                 self.selected_tool = self.tools[self.tool_index]
 
             # seed use key
-            if keys[pygame.K_LCTRL]:
+            if controls.held('plant'):
                 # run timer for seed use
                 self.timers['seed use'].activate()
                 self.direction = pygame.math.Vector2()
                 self.frame_index = 0
 
             # change seeds
-            if keys[pygame.K_e] and not self.timers['seed switch'].active:
-                self.timers['seed switch'].activate()
+            if controls.pressed('switch seed'):
                 self.seed_index += 1
                 # if seed index > lenth of seeds list => set to 0
                 self.seed_index = self.seed_index if self.seed_index < len(self.seeds) else 0
                 self.selected_seed = self.seeds[self.seed_index]
 
-            # pressing enter and checking if in sleep/merchant area
-            if keys[pygame.K_w]:
-                collided_interaction_sprite = pygame.sprite.spritecollide(self, self.interaction, False)
+            # pressing W and checking if in sleep/merchant area
+            if controls.pressed('interact'):
+                collided_interaction_sprite = [sprite for sprite in self.interaction.near(self.rect) if sprite.rect.colliderect(self.rect)]
                 if collided_interaction_sprite:
                     if collided_interaction_sprite[0].name == 'Trader':
                         self.toggle_shop()
@@ -188,12 +190,9 @@ class Player(pygame.sprite.Sprite):
         if self.timers['tool use'].active:
             self.status = self.status.split('_')[0] + '_' + self.selected_tool
 
-    def update_timers(self):
-        for timer in self.timers.values():
-            timer.update()
-
     def collision(self, direction):
-        for sprite in self.collision_sprites.sprites():
+        # only the sprites in the grid cells around the player can overlap its hitbox
+        for sprite in self.collision_sprites.near(self.hitbox):
             if hasattr(sprite, 'hitbox'):
                 # if true -> there is some kind of overlap occurring
                 if sprite.hitbox.colliderect(self.hitbox):
@@ -234,9 +233,9 @@ class Player(pygame.sprite.Sprite):
         self.collision('vertical')
 
     def update(self, dt):
+        self.previous_center.update(self.rect.center)
         self.input()
         self.get_status()
-        self.update_timers()
         self.get_target_pos()
 
         self.move(dt)
@@ -0,0 +1,135 @@
+import pygame
+import json
+import time
+from collections import deque
+from os.path import join
+from settings import *
+
+# returned by Profiler.scope while profiling is off, entering and leaving it does nothing
+class NullScope:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_SCOPE = NullScope()
+
+# times one named section of the frame
+class Scope:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, self.start, time.perf_counter())
+        return False
+
+# per subsystem frame timings with an on screen hud and chrome trace export (chrome://tracing, ui.perfetto.dev)
+class Profiler:
+    def __init__(self, history = 300):
+        self.enabled = False
+        self.show_hud = False
+        self.tracing = False
+
+        # the last frames' timings in ms
+        self.frame_times = deque(maxlen = history)
+        self.sections = {}
+        self.history = history
+
+        self.frame_start = 0
+        self.frame_sections = {}
+        self.trace_events = []
+        self.font = None
+
+    def scope(self, name):
+        # usage: with profiler.scope('draw'): ...
+        return Scope(self, name) if self.enabled else NULL_SCOPE
+
+    def record(self, name, start, end):
+        self.frame_sections[name] = self.frame_sections.get(name, 0) + (end - start) * 1000
+        if self.tracing:
+            self.trace_events.append({'name': name, 'ph': 'X', 'ts': start * 1e6, 'dur': (end - start) * 1e6, 'pid': 0, 'tid': 0})
+
+    def begin_frame(self):
+        if self.enabled:
+            self.frame_start = time.perf_counter()
+            self.frame_sections = {}
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+        self.record('frame', self.frame_start, time.perf_counter())
+        self.frame_times.append(self.frame_sections.pop('frame'))
+        for name, duration in self.frame_sections.items():
+            self.sections.setdefault(name, deque(maxlen = self.history)).append(duration)
+
+    def toggle_hud(self):
+        # the hud needs the timings, so showing it also turns profiling on
+        self.show_hud = not self.show_hud
+        self.enabled = self.show_hud or self.tracing
+
+    def toggle_trace(self, path = TRACE_PATH):
+        # the first call starts recording, the second one writes the trace file
+        if self.tracing:
+            self.export_trace(path)
+        else:
+            self.trace_events = []
+        self.tracing = not self.tracing
+        self.enabled = self.show_hud or self.tracing
+
+    def export_trace(self, path):
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': self.trace_events, 'displayTimeUnit': 'ms'}, file)
+
+    @staticmethod
+    def percentile(values, percent):
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))] if ordered else 0
+
+    def counts(self, level):
+        # live sprites per LAYERS z and per group
+        layer_names = {z: name for name, z in LAYERS.items()}
+        layers = {layer_names[z]: len(chunks) for z, chunks in level.all_sprites.layers.items()}
+        groups = {
+            'all': len(level.all_sprites),
+            'collision': len(level.collision_sprites),
+            'trees': len(level.tree_sprites),
+            'interaction': len(level.interaction_sprites),
+            'soil': len(level.soil_layer.soil_sprites),
+            'soil water': len(level.soil_layer.water_sprites),
+            'plants': len(level.soil_layer.plant_sprites),
+            'rain': level.rain.floor.count + level.rain.drops.count
+        }
+        return layers, groups
+
+    def display(self, surface, level):
+        if not self.show_hud or not self.frame_times:
+            return
+        if not self.font:
+            self.font = pygame.font.Font(join("font", "LycheeSoda.ttf"), 20)
+
+        frames = self.frame_times
+        lines = [f'frame  p50 {self.percentile(frames, 50):.2f}  p95 {self.percentile(frames, 95):.2f}  p99 {self.percentile(frames, 99):.2f} ms']
+        for name, times in sorted(self.sections.items(), key = lambda section: -section[1][-1]):
+            lines.append(f'{name:12}  {times[-1]:.2f}  p95 {self.percentile(times, 95):.2f} ms')
+
+        layers, groups = self.counts(level)
+        lines.append('layers  ' + '  '.join(f'{name} {count}' for name, count in layers.items() if count))
+        lines.append('groups  ' + '  '.join(f'{name} {count}' for name, count in groups.items()))
+        if self.tracing:
+            lines.append(f'tracing... {len(self.trace_events)} events')
+
+        top = 10
+        for line in lines:
+            text_surf = self.font.render(line, False, 'White', 'Black')
+            surface.blit(text_surf, (10, top))
+            top += text_surf.get_height()
+
+profiler = Profiler()
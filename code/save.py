@@ -0,0 +1,183 @@
+import os
+import queue
+import struct
+import threading
+import zlib
+from os.path import join, exists
+from settings import *
+
+# every section is its own file: a small header followed by the packed payload
+SAVE_MAGIC = b'SPRT'
+SAVE_VERSION = 2
+HEADER = struct.Struct('<4sHHII')  # magic, version, section id, payload length, payload crc32
+SECTIONS = ('player', 'soil', 'plants', 'trees')
+
+PLAYER = struct.Struct('<iffBBB')  # money, x, y, tool index, seed index, raining
+GRID_SIZE = struct.Struct('<HH')   # width, height
+COUNT = struct.Struct('<I')
+PLANT = struct.Struct('<HHBd')     # cell x, cell y, plant type, age (a double, so growth adds up exactly as in game)
+TREE = struct.Struct('<hBB')       # health, alive, apple mask
+
+PLANT_TYPES = list(GROW_SPEED)
+
+# saves the farm in compact versioned binary sections, only sections that changed are written, on a background thread
+class SaveGame:
+    def __init__(self, path = SAVE_DIR):
+        self.path = path
+        # section -> crc of the data last written or read, to skip unchanged sections
+        self.written = {}
+
+        self.queue = queue.Queue()
+        self.worker = None
+        # the first write error of the background thread, raised by flush
+        self.error = None
+
+    # packing (runs on the main thread, it only copies numbers)
+    def pack_player(self, level):
+        player = level.player
+        data = PLAYER.pack(player.money, player.pos.x, player.pos.y, player.tool_index, player.seed_index, level.raining)
+        counts = list(player.item_inventory.values()) + list(player.seed_inventory.values())
+        return data + struct.pack(f'<{len(counts)}I', *counts)
+
+    def pack_soil(self, level):
+        grid = level.soil_layer.grid
+        return GRID_SIZE.pack(grid.width, grid.height) + zlib.compress(grid.tobytes())
+
+    def pack_plants(self, level):
+        plants = level.soil_layer.plant_sprites.sprites()
+        return COUNT.pack(len(plants)) + b''.join(PLANT.pack(
+            plant.soil.rect.x // TILE_SIZE, plant.soil.rect.y // TILE_SIZE, PLANT_TYPES.index(plant.plant_type), plant.age)
+            for plant in plants)
+
+    def pack_trees(self, level):
+        # trees are matched up by their order in the map
+        trees = level.tree_sprites.sprites()
+        return COUNT.pack(len(trees)) + b''.join(TREE.pack(
+            max(-32768, tree.health), tree.alive, tree.fruit_mask()) for tree in trees)
+
+    def snapshot(self, level):
+        return {name: getattr(self, f'pack_{name}')(level) for name in SECTIONS}
+
+    # writing
+    def save(self, level):
+        changed = {}
+        for name, data in self.snapshot(level).items():
+            if self.written.get(name) != zlib.crc32(data):
+                changed[name] = data
+
+        if changed:
+            if not self.worker:
+                self.worker = threading.Thread(target = self.write_loop, daemon = True)
+                self.worker.start()
+            self.queue.put(changed)
+
+    def write_loop(self):
+        while True:
+            changed = self.queue.get()
+            try:
+                os.makedirs(self.path, exist_ok = True)
+                for name, data in changed.items():
+                    self.write_section(name, data)
+                    # only a section that is on disk counts as saved, a failed one is written again next time
+                    self.written[name] = zlib.crc32(data)
+            except OSError as error:
+                self.error = self.error or error
+            finally:
+                self.queue.task_done()
+
+    def write_section(self, name, data):
+        # write next to the old file and swap it in, so a crash never leaves half a section behind
+        path = join(self.path, f'{name}.bin')
+        with open(path + '.tmp', 'wb') as file:
+            file.write(HEADER.pack(SAVE_MAGIC, SAVE_VERSION, SECTIONS.index(name), len(data), zlib.crc32(data)))
+            file.write(data)
+        os.replace(path + '.tmp', path)
+
+    def flush(self):
+        # wait until every queued section is on disk (e.g. before quitting), raises if a write failed
+        self.queue.join()
+        if self.error:
+            error, self.error = self.error, None
+            raise error
+
+    # loading
+    def read_section(self, name):
+        path = join(self.path, f'{name}.bin')
+        if not exists(path):
+            return None
+        with open(path, 'rb') as file:
+            content = file.read()
+
+        if len(content) < HEADER.size:
+            return None
+        magic, version, section, length, crc = HEADER.unpack_from(content)
+        data = content[HEADER.size:]
+        # sections from another version or damaged files are ignored
+        if magic != SAVE_MAGIC or version != SAVE_VERSION or section != SECTIONS.index(name) or len(data) != length or zlib.crc32(data) != crc:
+            return None
+
+        self.written[name] = crc
+        return data
+
+    def load(self, level):
+        sections = {name: self.read_section(name) for name in SECTIONS}
+        if not any(sections.values()):
+            return False
+
+        if sections['soil']:
+            self.load_soil(level, sections['soil'], sections['plants'])
+        if sections['trees']:
+            self.load_trees(level, sections['trees'])
+        if sections['player']:
+            self.load_player(level, sections['player'])
+        return True
+
+    def load_soil(self, level, soil, plants):
+        soil_layer = level.soil_layer
+        width, height = GRID_SIZE.unpack_from(soil)
+        # a save from a different map size cannot be applied
+        if (width, height) != (soil_layer.grid.width, soil_layer.grid.height):
+            return
+        cells = zlib.decompress(soil[GRID_SIZE.size:])
+
+        plant_list = []
+        if plants:
+            count, = COUNT.unpack_from(plants)
+            for x, y, plant_type, age in PLANT.iter_unpack(plants[COUNT.size:COUNT.size + count * PLANT.size]):
+                plant_list.append(((x, y), PLANT_TYPES[plant_type], age))
+
+        soil_layer.restore(cells, plant_list)
+
+    def load_trees(self, level, data):
+        count, = COUNT.unpack_from(data)
+        trees = level.tree_sprites.sprites()
+        if count != len(trees):
+            return
+
+        for tree, (health, alive, mask) in zip(trees, TREE.iter_unpack(data[COUNT.size:])):
+            tree.health = health
+            if tree.alive and not alive:
+                tree.make_stump()
+            tree.create_fruit(mask)
+
+    def load_player(self, level, data):
+        player = level.player
+        money, x, y, tool_index, seed_index, raining = PLAYER.unpack_from(data)
+
+        player.money = money
+        player.pos.update(x, y)
+        player.hitbox.center = (round(x), round(y))
+        player.rect.center = player.hitbox.center
+        player.previous_center.update(player.rect.center)
+
+        player.tool_index, player.seed_index = tool_index, seed_index
+        player.selected_tool = player.tools[tool_index]
+        player.selected_seed = player.seeds[seed_index]
+
+        # items then seeds, matched by position since the crops are in both inventories
+        items = len(player.item_inventory)
+        counts = struct.unpack_from(f'<{items + len(player.seed_inventory)}I', data, PLAYER.size)
+        player.item_inventory.update(zip(player.item_inventory, counts[:items]))
+        player.seed_inventory.update(zip(player.seed_inventory, counts[items:]))
+
+        level.set_raining(bool(raining))
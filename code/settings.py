@@ -1,9 +1,67 @@
 from pygame.math import Vector2
+from os.path import join
 # screen
 SCREEN_WIDTH = 1280
 SCREEN_HEIGHT = 720
 TILE_SIZE = 64
 
+# main loop
+# frames drawn per second (0 to draw as fast as possible) and whether to wait for the display refresh
+FPS = 60
+VSYNC = False
+# simulate in fixed steps independent of the frame rate, False for one variable step per frame
+FIXED_TIMESTEP = True
+SIMULATION_RATE = 60
+# most simulation steps run before a frame is drawn, a slower machine drops time instead of falling further behind
+MAX_SIMULATION_STEPS = 5
+# size of the map chunks used to find the sprites near the screen
+CHUNK_SIZE = TILE_SIZE * 4
+# while the camera stands still only redraw and present the parts of the screen that changed
+DIRTY_RECTS = False
+# more changed areas than this are merged into one, a full frame is drawn once they cover this much of the screen
+DIRTY_RECT_LIMIT = 32
+DIRTY_AREA_LIMIT = 0.5
+
+# input actions and the keys bound to them (pygame key names)
+KEY_BINDINGS = {
+	'up': ['up'],
+	'down': ['down'],
+	'left': ['left'],
+	'right': ['right'],
+	'use tool': ['space'],
+	'switch tool': ['q'],
+	'plant': ['left ctrl'],
+	'switch seed': ['e'],
+	'interact': ['w'],
+	'menu up': ['up'],
+	'menu down': ['down'],
+	'menu select': ['space'],
+	'menu close': ['escape']
+}
+
+# actions that repeat while held: (delay before the first repeat, interval between repeats) in seconds
+KEY_REPEAT = {
+	'switch tool': (0.2, 0.2),
+	'switch seed': (0.2, 0.2),
+	'menu up': (0.2, 0.2),
+	'menu down': (0.2, 0.2),
+	'menu select': (0.2, 0.2)
+}
+
+# profiler hud/trace keys and where the trace is written
+PROFILER_HUD_KEY = 'f3'
+PROFILER_TRACE_KEY = 'f4'
+TRACE_PATH = 'trace.json'
+
+# save files and how often (seconds of play) the game autosaves, it also saves every night
+SAVE_DIR = 'save'
+AUTOSAVE_INTERVAL = 60
+
+# map
+MAP_PATH = join('data', 'map.tmx')
+# optional on-disk cache of the parsed map (e.g. join('data', 'map.cache')), None to always parse the tmx
+MAP_CACHE_PATH = None
+
 # overlay positions 
 OVERLAY_POSITIONS = {
 	'tool' : (40, SCREEN_HEIGHT - 15), 
@@ -35,6 +93,30 @@ APPLE_POS = {
 	'Large': [(30,24), (60,65), (50,50), (16,40),(45,50), (42,70)]
 }
 
+# soil tile graphic for every combination of tilled neighbours (top = 1, right = 2, bottom = 4, left = 8)
+SOIL_TILES = {
+	0: 'o',
+	1: 'b',
+	2: 'l',
+	3: 'bl',
+	4: 't',
+	5: 'tb',
+	6: 'tl',
+	7: 'tbr',
+	8: 'r',
+	9: 'br',
+	10: 'lr',
+	11: 'lrb',
+	12: 'tr',
+	13: 'tbl',
+	14: 'lrt',
+	15: 'x'
+}
+
+# rain drops (and floor splashes) spawned per second and the most that can be alive at once
+RAIN_RATE = 120
+RAIN_CAPACITY = 400
+
 GROW_SPEED = {
 	'corn': 1,
 	'tomato': 0.7
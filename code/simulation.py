@@ -0,0 +1,291 @@
+import os
+# settings imports pygame, its import banner would end up in the --json output
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import argparse
+import json
+import random
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from settings import *
+from grid import *
+from support import assets
+from os.path import join, dirname, abspath
+
+# a plant stops growing on the last frame of its graphics, the same rule as Plant.max_age
+def plant_max_ages(root = dirname(dirname(abspath(__file__)))):
+    return {plant_type: len(assets.folder_files(join(root, 'graphics', 'fruit', plant_type))) - 1 for plant_type in GROW_SPEED}
+
+PLANT_MAX_AGE = plant_max_ages()
+TREE_HEALTH = 5
+
+# the whole farm as plain numbers: no sprites, surfaces or sounds, so a day is a few list/dict operations
+class FarmState:
+    def __init__(self, grid, plants = None, trees = None, money = 200, items = None, seeds = None, raining = False):
+        self.grid = grid
+        # grid cell -> [plant type, age]
+        self.plants = plants if plants is not None else {}
+        # one [health, alive, apple positions, apples] per tree
+        self.trees = trees if trees is not None else []
+        self.money = money
+        self.items = items if items is not None else {'wood': 0, 'apple': 0, 'corn': 0, 'tomato': 0}
+        self.seeds = seeds if seeds is not None else {'corn': 5, 'tomato': 5}
+        self.raining = raining
+
+    def copy(self):
+        return FarmState(
+            grid = SoilGrid(self.grid.width, self.grid.height, self.grid.tobytes()),
+            plants = {cell: list(plant) for cell, plant in self.plants.items()},
+            trees = [list(tree) for tree in self.trees],
+            money = self.money,
+            items = dict(self.items),
+            seeds = dict(self.seeds),
+            raining = self.raining)
+
+    # snapshot of a running game
+    @classmethod
+    def from_level(cls, level):
+        soil_layer = level.soil_layer
+        player = level.player
+        return cls(
+            grid = SoilGrid(soil_layer.grid.width, soil_layer.grid.height, soil_layer.grid.tobytes()),
+            plants = {cell: [plant.plant_type, plant.age] for cell, plant in soil_layer.plants.items()},
+            trees = [[tree.health, tree.alive, len(tree.apples), len(tree.apple_sprites)] for tree in level.tree_sprites.sprites()],
+            money = player.money,
+            items = dict(player.item_inventory),
+            seeds = dict(player.seed_inventory),
+            raining = level.raining)
+
+    # a made up farm of any size, e.g. to project a much bigger farm than the map has room for
+    @classmethod
+    def synthetic(cls, width = 50, height = 40, tilled = 0.1, trees = 150, seed = 0):
+        rng = random.Random(seed)
+        grid = SoilGrid(width, height, bytes([FARMABLE]) * (width * height))
+        for index in rng.sample(range(width * height), int(width * height * tilled)):
+            grid.cells[index] |= TILLED
+        sizes = list(APPLE_POS.values())
+        return cls(grid, trees = [[TREE_HEALTH, True, len(sizes[index % len(sizes)]), 0] for index in range(trees)])
+
+    # the night, in the same order as Level.reset
+    def rollover(self, rng):
+        # watered plants grow
+        plants = self.plants
+        for cell in self.grid.positions(PLANTED | WATERED):
+            plant = plants.get(cell)
+            if plant:
+                plant[1] = min(plant[1] + GROW_SPEED[plant[0]], PLANT_MAX_AGE[plant[0]])
+
+        # the soil dries out, then maybe it rains on every soil patch
+        self.grid.clear_all(WATERED)
+        self.raining = rng.randint(0, 10) > 7
+        if self.raining:
+            self.grid.mark_all(WATERED, where = TILLED)
+
+        # new apples, one random draw for every apple position
+        grows = rng.choices((True, False), weights = (2, 9), k = sum(tree[2] for tree in self.trees))
+        start = 0
+        for tree in self.trees:
+            end = start + tree[2]
+            tree[3] = sum(grows[start:end])
+            start = end
+
+    # economy, same rules as the shop menu
+    def sell(self, item, amount = None):
+        amount = self.items[item] if amount is None else min(amount, self.items[item])
+        self.items[item] -= amount
+        self.money += SALE_PRICES[item] * amount
+        return amount
+
+    def buy(self, seed, amount):
+        amount = max(0, min(amount, self.money // PURCHASE_PRICES[seed]))
+        self.seeds[seed] += amount
+        self.money -= PURCHASE_PRICES[seed] * amount
+        return amount
+
+    # player actions
+    def harvest(self):
+        harvested = {}
+        for cell, (plant_type, age) in list(self.plants.items()):
+            if age >= PLANT_MAX_AGE[plant_type]:
+                del self.plants[cell]
+                self.grid.clear(*cell, PLANTED)
+                self.items[plant_type] += 1
+                harvested[plant_type] = harvested.get(plant_type, 0) + 1
+        return harvested
+
+    def chop_apples(self):
+        # every axe hit knocks one apple off and damages the tree, a tree that runs out of health leaves a stump and wood
+        apples = 0
+        for tree in self.trees:
+            if tree[3]:
+                apples += tree[3]
+                tree[0] -= tree[3]
+                tree[3] = 0
+                if tree[1] and tree[0] <= 0:
+                    tree[1] = False
+                    self.items['wood'] += 1
+        self.items['apple'] += apples
+        return apples
+
+    def plant(self, seed, limit = None):
+        cells = self.grid.positions(TILLED | PLANTED, TILLED)
+        count = min(len(cells), self.seeds[seed], len(cells) if limit is None else limit)
+        for cell in cells[:count]:
+            self.grid.set(*cell, PLANTED)
+            self.plants[cell] = [seed, 0]
+        self.seeds[seed] -= count
+        return count
+
+    def till(self, count):
+        cells = self.grid.positions(FARMABLE | TILLED, FARMABLE)[:count]
+        for cell in cells:
+            self.grid.set(*cell, TILLED)
+        if self.raining:
+            self.grid.mark_all(WATERED, where = TILLED)
+        return len(cells)
+
+    def water(self):
+        return len(self.grid.mark_all(WATERED, where = TILLED))
+
+    def summary(self):
+        return {
+            'money': self.money,
+            'plants': len(self.plants),
+            'tilled': self.grid.count(TILLED),
+            'stumps': sum(1 for tree in self.trees if not tree[1]),
+            'items': dict(self.items),
+            'seeds': dict(self.seeds)
+        }
+
+# what the player does every day before going to bed: harvest, pick apples, sell, restock seeds, plant and water
+class FarmPolicy:
+    def __init__(self, crop = 'corn', till_per_day = 0, chop_apples = True, sell = True, water = True):
+        self.crop = crop
+        self.till_per_day = till_per_day
+        self.chop_apples = chop_apples
+        self.sell = sell
+        self.water = water
+
+    def __call__(self, state, day, rng, stats):
+        for plant_type, amount in state.harvest().items():
+            stats['harvested'][plant_type] += amount
+        if self.chop_apples:
+            stats['apples'] += state.chop_apples()
+        if self.till_per_day:
+            state.till(self.till_per_day)
+        if self.sell:
+            for item in state.items:
+                stats['earned'] += SALE_PRICES[item] * state.sell(item)
+
+        # buy only the seeds needed to fill the empty soil
+        empty = state.grid.count(TILLED | PLANTED, TILLED)
+        bought = state.buy(self.crop, empty - state.seeds[self.crop])
+        stats['spent'] += PURCHASE_PRICES[self.crop] * bought
+        stats['planted'] += state.plant(self.crop)
+
+        if self.water:
+            state.water()
+
+def simulate(state, days, policy = None, seed = None):
+    # the state passed in is never changed, every run starts from a copy
+    state = state.copy()
+    policy = policy or FarmPolicy()
+    rng = random.Random(seed)
+    start_money = state.money
+    stats = {'harvested': {plant_type: 0 for plant_type in GROW_SPEED}, 'apples': 0, 'earned': 0, 'spent': 0, 'planted': 0, 'rainy_days': 0}
+
+    for day in range(days):
+        policy(state, day, rng, stats)
+        state.rollover(rng)
+        stats['rainy_days'] += state.raining
+
+    stats['profit'] = state.money - start_money
+    stats.update(state.summary())
+    stats['seed'] = seed
+    return stats
+
+def run_scenario(task):
+    state, days, policy, seed = task
+    return simulate(state, days, policy, seed)
+
+# numbers of a (nested) result dict as flat 'a.b' keys
+def flatten(result, prefix = ''):
+    flat = {}
+    for key, value in result.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f'{prefix}{key}.'))
+        elif isinstance(value, (int, float)) and key != 'seed':
+            flat[prefix + key] = value
+    return flat
+
+def aggregate(results):
+    columns = {}
+    for result in results:
+        for key, value in flatten(result).items():
+            columns.setdefault(key, []).append(value)
+
+    stats = {}
+    for key, values in columns.items():
+        values.sort()
+        stats[key] = {
+            'mean': round(statistics.fmean(values), 4),
+            'stdev': round(statistics.pstdev(values), 4),
+            'min': values[0],
+            'p10': values[int(len(values) * 0.1)],
+            'median': values[len(values) // 2],
+            'p90': values[min(len(values) - 1, int(len(values) * 0.9))],
+            'max': values[-1]
+        }
+    return stats
+
+# runs one scenario per seed (in parallel when workers != 1), results come back in seed order so they are reproducible
+def run_scenarios(state, days, seeds, policy = None, workers = None):
+    tasks = [(state, days, policy, seed) for seed in seeds]
+    if workers == 1:
+        results = list(map(run_scenario, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers = workers) as executor:
+            results = list(executor.map(run_scenario, tasks, chunksize = max(1, len(tasks) // 32)))
+    return {'scenarios': len(results), 'days': days, 'stats': aggregate(results), 'results': results}
+
+def main(args = None):
+    parser = argparse.ArgumentParser(description = 'Project crop yields and money over many days without running the game.')
+    parser.add_argument('--days', type = int, default = 28)
+    parser.add_argument('--scenarios', type = int, default = 100)
+    parser.add_argument('--seed', type = int, default = 0, help = 'seed of the first scenario, the rest count up from it')
+    parser.add_argument('--workers', type = int, help = 'worker processes (1 runs everything in this process)')
+    parser.add_argument('--crop', choices = list(GROW_SPEED), default = 'corn')
+    parser.add_argument('--till', type = int, default = 0, help = 'farmable tiles hoed every day')
+    parser.add_argument('--synthetic', metavar = 'WxH', help = 'simulate a made up farm of this many tiles instead of the map')
+    parser.add_argument('--tilled', type = float, default = 0.1, help = 'part of the synthetic farm that starts hoed')
+    parser.add_argument('--trees', type = int, default = 150, help = 'trees on the synthetic farm')
+    parser.add_argument('--json', action = 'store_true', help = 'print the full result as json')
+    args = parser.parse_args(args)
+
+    if args.synthetic:
+        width, height = (int(size) for size in args.synthetic.lower().split('x'))
+        state = FarmState.synthetic(width, height, args.tilled, args.trees, args.seed)
+    else:
+        # the starting farm comes from the map
+        import pygame
+        from headless import create_level
+        level = create_level()
+        state = FarmState.from_level(level)
+        pygame.quit()
+
+    start = time.perf_counter()
+    result = run_scenarios(state, args.days, range(args.seed, args.seed + args.scenarios), FarmPolicy(args.crop, args.till), args.workers)
+    elapsed = time.perf_counter() - start
+
+    if args.json:
+        print(json.dumps(result))
+    else:
+        for key in ('money', 'profit', f'harvested.{args.crop}', 'apples', 'rainy_days'):
+            stats = result['stats'][key]
+            print(f"{key:>16}: mean {stats['mean']:.1f}  p10 {stats['p10']}  median {stats['median']}  p90 {stats['p90']}")
+        print(f"{args.scenarios} scenarios x {args.days} days in {elapsed:.2f}s")
+    return result
+
+if __name__ == '__main__':
+    main()
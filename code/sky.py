@@ -1,78 +1,144 @@
-import pygame
 from settings import *
 from support import import_folder
 from os.path import join
-from sprites import Generic
-from random import randint, choice
+from tilemap import load_map
+from random import randint
+from array import array
 
 class Sky:
-    def __init__(self):
-        # screen setup
-        self.display_surface = pygame.display.get_surface()
-        self.full_surf = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    def __init__(self, lighting):
+        # the sky colour is applied by the shared lighting pass
+        self.lighting = lighting
 
         # start and end color values to transition between
         self.start_color = [255, 255, 255]
         self.end_color = (38, 101, 189)
 
-    # applies a surface over the entire game window
-    def display(self, dt):
+    def update(self, dt):
         # reduce the start color values until they reach the end color
         for index, value in enumerate(self.end_color):
             if self.start_color[index] > value:
                 self.start_color[index] -= 2 * dt
 
-        # display the color on the screen
-        self.full_surf.fill(self.start_color)
-        self.display_surface.blit(self.full_surf, (0,0), special_flags = pygame.BLEND_RGBA_MULT)
+    # applies the color over the entire game window
+    def display(self):
+        # tint the screen with the color
+        self.lighting.tint(self.start_color)
 
-class Drop(Generic):
-    def __init__(self, surf, pos, moving, groups, z):
-        super().__init__(pos, surf, groups, z)
+# a fixed size pool of rain particles stored in flat arrays instead of one sprite per drop
+class RainParticles:
+    def __init__(self, frames, capacity):
+        self.frames = frames
+        self.capacity = capacity
 
-        # life and timer setup
-        self.lifetime = randint(400, 500)
-        self.start_time = pygame.time.get_ticks()
+        # particle state, a particle's position is spawn position + velocity * age so nothing has to be integrated every frame
+        self.x = array('d', [0]) * capacity
+        self.y = array('d', [0]) * capacity
+        self.vx = array('d', [0]) * capacity
+        self.vy = array('d', [0]) * capacity
+        self.born = array('d', [0]) * capacity
+        self.death = array('d', [0]) * capacity
+        self.frame = array('B', [0]) * capacity
 
-        # movement setup
-        self.moving = moving
-        if self.moving:
-            self.pos = pygame.math.Vector2(self.rect.topleft)
-            self.direction = pygame.math.Vector2(-2, 4)
-            self.speed = randint(200, 250)
+        # live particles are the ring buffer slots [head - count, head) in spawn order
+        self.head = 0
+        self.count = 0
+        self.time = 0
 
-    def update(self, dt):
-        # moving the rain drop
-        if self.moving:
-            self.pos += self.direction * self.speed * dt
-            self.rect.topleft = (round(self.pos.x), round(self.pos.y))
-        
-        # remove the rain drop sprite after its lifetime is over
-        if pygame.time.get_ticks() - self.start_time >= self.lifetime:
-            self.kill()
+    def expire(self):
+        # the oldest particles sit at the tail of the ring, free their slots once their lifetime is over
+        tail = (self.head - self.count) % self.capacity
+        while self.count and self.death[tail] <= self.time:
+            tail = (tail + 1) % self.capacity
+            self.count -= 1
+
+    def spawn(self, x, y, vx, vy, lifetime):
+        # the pool size is the density cap, extra drops are simply not spawned
+        if self.count == self.capacity:
+            return
+
+        index = self.head
+        self.x[index], self.y[index] = x, y
+        self.vx[index], self.vy[index] = vx, vy
+        self.born[index] = self.time
+        self.death[index] = self.time + lifetime
+        self.frame[index] = randint(0, len(self.frames) - 1)
+
+        self.head = (index + 1) % self.capacity
+        self.count += 1
+
+    # (frame, screen position) of every live particle inside screen_rect
+    def visible(self, offset, screen_rect):
+        time, frames = self.time, self.frames
+        left, top = screen_rect.left - TILE_SIZE, screen_rect.top - TILE_SIZE
+        right, bottom = screen_rect.right, screen_rect.bottom
+
+        blits = []
+        for slot in range(self.head - self.count, self.head):
+            index = slot % self.capacity
+            if self.death[index] <= time:
+                continue
+
+            age = time - self.born[index]
+            x = self.x[index] + self.vx[index] * age
+            y = self.y[index] + self.vy[index] * age
+            if left < x < right and top < y < bottom:
+                blits.append((frames[self.frame[index]], (round(x - offset.x), round(y - offset.y))))
+        return blits
+
+    def draw(self, surface, offset, screen_rect):
+        # called by the camera in this particle layer's slot, blits every visible particle in one batch
+        surface.blits(self.visible(offset, screen_rect), False)
+
+    # the screen areas the particles will cover, for dirty rect rendering
+    def bounds(self, offset, screen_rect):
+        return [frame.get_rect(topleft = pos) for frame, pos in self.visible(offset, screen_rect)]
 
 class Rain:
     def __init__(self, all_sprites):
         self.all_sprites = all_sprites
         self.rain_drops = import_folder(join("graphics", "rain", "drops"))
         self.rain_floor = import_folder(join("graphics", "rain", "floor"))
-        self.floor_w, self.floor_h = pygame.image.load(join("graphics", "world","ground.png")).get_size()
+        tile_map = load_map()
+        self.floor_w, self.floor_h = tile_map.pixel_width, tile_map.pixel_height
+
+        # particle pools drawn by the camera in their layer slot
+        self.floor = RainParticles(self.rain_floor, RAIN_CAPACITY)
+        self.drops = RainParticles(self.rain_drops, RAIN_CAPACITY)
+        self.all_sprites.add_renderer(LAYERS['rain floor'], self.floor.draw, self.floor.bounds)
+        self.all_sprites.add_renderer(LAYERS['rain drops'], self.drops.draw, self.drops.bounds)
+
+        # new drops are only spawned while raining, the remaining ones still finish their lifetime
+        self.raining = False
+        self.spawn_budget = 0
 
     def create_floor(self):
-        Drop(
-            surf = choice(self.rain_floor),
-            pos = (randint(0, self.floor_w), randint(0, self.floor_h)),
-            moving = False, 
-            groups = self.all_sprites, 
-            z = LAYERS['rain floor'])
+        self.floor.spawn(
+            x = randint(0, self.floor_w), 
+            y = randint(0, self.floor_h), 
+            vx = 0, 
+            vy = 0, 
+            lifetime = randint(400, 500) / 1000)
 
     def create_drops(self):
-        Drop(surf = choice(self.rain_drops),
-            pos = (randint(0, self.floor_w), randint(0, self.floor_h)),
-            moving = True, 
-            groups = self.all_sprites, 
-            z = LAYERS['rain drops'])
-
-    def update(self):
-        self.create_floor()
-        self.create_drops()
\ No newline at end of file
+        # drops fall along (-2, 4) at a random speed
+        speed = randint(200, 250)
+        self.drops.spawn(
+            x = randint(0, self.floor_w), 
+            y = randint(0, self.floor_h), 
+            vx = -2 * speed, 
+            vy = 4 * speed, 
+            lifetime = randint(400, 500) / 1000)
+
+    def update(self, dt):
+        for particles in (self.floor, self.drops):
+            particles.time += dt
+            particles.expire()
+
+        # spawn at a fixed rate per second whatever the frame rate is
+        if self.raining:
+            self.spawn_budget += RAIN_RATE * dt
+            while self.spawn_budget >= 1:
+                self.spawn_budget -= 1
+                self.create_floor()
+                self.create_drops()
@@ -1,7 +1,8 @@
 import pygame
 from settings import *
 from os.path import join
-from pytmx.util_pygame import load_pygame
+from tilemap import load_map
+from grid import *
 from support import *
 from random import choice
 
@@ -20,18 +21,15 @@ class WaterTile(pygame.sprite.Sprite):
         self.z = LAYERS['soil water']
 
 class Plant(pygame.sprite.Sprite):
-    def __init__(self, plant_type, groups, soil, check_watered):
+    def __init__(self, plant_type, groups, soil):
         super().__init__(groups)
 
         # plant setup
         self.plant_type = plant_type
-        if self.plant_type == 'corn':
-            self.frames = import_folder(join("graphics", "fruit", "corn"))
-        if self.plant_type == 'tomato':
-            self.frames = import_folder(join("graphics", "fruit", "tomato"))
+        # the frames come from the asset cache, so planting a seed never touches the disk
+        self.frames = import_folder(join("graphics", "fruit", plant_type))
     
         self.soil = soil
-        self.check_watered = check_watered
 
         # plant growth settings
         self.age = 0
@@ -45,21 +43,27 @@ class Plant(pygame.sprite.Sprite):
         self.rect = self.image.get_rect(midbottom = soil.rect.midbottom + pygame.math.Vector2(0, self.y_offset))
         self.z = LAYERS['ground plant']
 
-    def grow(self):
-        if self.check_watered(self.rect.center):
-            self.age += self.grow_speed
+    # returns True when the plant changed frame (and so its image, rect and hitbox)
+    def set_age(self, age):
+        frame = int(self.age)
+        self.age = age
 
-            # change plant layer when it grows to allow player collision
-            if int(self.age) > 0:
-                self.z = LAYERS['main']
-                self.hitbox = self.rect.copy().inflate(-26, -self.rect.height * 0.4)
+        if self.age >= self.max_age:
+            self.age = self.max_age
+            self.harvestable = True
 
-            if self.age >= self.max_age:
-                self.age = self.max_age
-                self.harvestable = True
+        # most nights a plant only grows a fraction of a frame, nothing to redraw
+        if int(self.age) == frame:
+            return False
 
-            self.image = self.frames[int(self.age)]
-            self.rect = self.image.get_rect(midbottom = self.soil.rect.midbottom + pygame.math.Vector2(0, self.y_offset))
+        self.image = self.frames[int(self.age)]
+        self.rect = self.image.get_rect(midbottom = self.soil.rect.midbottom + pygame.math.Vector2(0, self.y_offset))
+
+        # change plant layer when it grows to allow player collision
+        if int(self.age) > 0:
+            self.z = LAYERS['main']
+            self.hitbox = self.rect.copy().inflate(-26, -self.rect.height * 0.4)
+        return True
 
 class SoilLayer:
     def __init__(self, all_sprites, collision_sprites):
@@ -69,170 +73,189 @@ class SoilLayer:
         self.soil_sprites = pygame.sprite.Group()
         self.water_sprites = pygame.sprite.Group()
         self.plant_sprites = pygame.sprite.Group()
+        # grid cell -> soil tile sprite on that cell
+        self.soil_tiles = {}
+        # water tiles are kept after drying out and shown again the next time the cell is watered
+        self.water_tiles = {}
+        # grid cell -> plant on that cell, and the same for only the plants that can be harvested
+        self.plants = {}
+        self.harvestable = {}
 
         # soil graphics setup
         self.soil_surfs = import_folder_dict(join("graphics", "soil"))
         self.water_surfs = import_folder(join("graphics", "soil_water"))
+        assets.preload(folders = [join("graphics", "fruit", plant_type) for plant_type in GROW_SPEED])
+        # harvesting flashes the grown plant
+        assets.preload(silhouettes = [import_folder(join("graphics", "fruit", plant_type))[-1] for plant_type in GROW_SPEED])
 
         # calling methods
         self.create_soil_grid()
-        self.create_hit_rects()
 
         # game sounds
-        self.hoe_sound = pygame.mixer.Sound(join("audio", "hoe.wav"))
+        self.hoe_sound = assets.sound(join("audio", "hoe.wav"))
         self.hoe_sound.set_volume(0.1)
 
-        self.plant_sound = pygame.mixer.Sound(join("audio", "plant.wav"))
+        self.plant_sound = assets.sound(join("audio", "plant.wav"))
         self.plant_sound.set_volume(0.1)
 
     def create_soil_grid(self):
-        ground = pygame.image.load(join("graphics", "world", "ground.png"))
-        h_tiles, v_tiles = ground.get_width() // TILE_SIZE, ground.get_height() // TILE_SIZE
+        # the map is parsed once and shared with the level
+        tile_map = load_map()
 
-        # a list of lists that each contain information about every tile on the map
-        self.grid = [[[] for col in range(h_tiles)] for row in range(v_tiles)]
+        # one byte of flags for every tile on the map (grid[y][x] still works like the old list of markers)
+        self.grid = SoilGrid(tile_map.width, tile_map.height)
         
-        for x, y, _ in load_pygame(join("data", "map.tmx")).get_layer_by_name('Farmable').tiles():
-            self.grid[y][x].append('F')
+        for x, y, _ in tile_map.tiles('Farmable'):
+            self.grid.set(x, y, FARMABLE)
     
-    # creating a rect for every tile on the map that the player can hit
-    def create_hit_rects(self):
-        self.hit_rects = []
-        for index_row, row in enumerate(self.grid):
-            for index_col, cell in enumerate(row):
-                # if the tile is farmable, create a rect for that tiles position
-                if 'F' in cell:
-                    x = index_col * TILE_SIZE
-                    y = index_row * TILE_SIZE
-                    rect = pygame.Rect(x, y, TILE_SIZE, TILE_SIZE)
-                    self.hit_rects.append(rect)
+    # the grid cell under a pixel position (e.g. the player target), None when off the map
+    def cell_at(self, point):
+        x = int(point[0] // TILE_SIZE)
+        y = int(point[1] // TILE_SIZE)
+        return (x, y) if self.grid.inside(x, y) else None
 
     def get_hit(self, point):
-        for rect in self.hit_rects:
-            if rect.collidepoint(point):
-                self.hoe_sound.play()
-
-                x = rect.x // TILE_SIZE
-                y = rect.y // TILE_SIZE
-                # if the tile the player hoe's is farmable, add an X to represent a soil patch added
-                if 'F' in self.grid[y][x]:
-                    self.grid[y][x].append('X')
-                    self.create_soil_tiles()
-                    if self.raining:
-                        self.water_all()
-
-    # check if the target position for watering is hitting a soil sprite tile
+        cell = self.cell_at(point)
+        # if the tile the player hoe's is farmable, flag it as tilled to represent a soil patch added
+        if cell and self.grid.has(*cell, FARMABLE):
+            self.hoe_sound.play()
+
+            self.grid.set(*cell, TILLED)
+            self.update_soil_area(*cell)
+            if self.raining:
+                self.water_all()
+
+    def create_water_tile(self, x, y):
+        tile = self.water_tiles.get((x, y))
+        if tile:
+            tile.image = choice(self.water_surfs)
+            tile.add(self.all_sprites, self.water_sprites)
+        else:
+            # switching the grid cell positions to actual pixel positions for the game
+            self.water_tiles[(x, y)] = WaterTile((x * TILE_SIZE, y * TILE_SIZE), choice(self.water_surfs), [self.all_sprites, self.water_sprites])
+
+    # check if the target position for watering is hitting a soil tile
     def water(self, target_pos):
-        for soil_sprite in self.soil_sprites.sprites():
-            if soil_sprite.rect.collidepoint(target_pos):
-                # if true, add 'W' to soil dict in the correct spot to indicate watered
-                x = soil_sprite.rect.x // TILE_SIZE
-                y = soil_sprite.rect.y // TILE_SIZE
-                self.grid[y][x].append('W')
-
-                # create a water sprite
-                pos = soil_sprite.rect.topleft
-                surf = choice(self.water_surfs)
-                WaterTile(pos, surf, [self.all_sprites, self.water_sprites])
+        cell = self.cell_at(target_pos)
+        # watering a tile that is already wet does nothing
+        if cell in self.soil_tiles and not self.grid.has(*cell, WATERED):
+            self.grid.set(*cell, WATERED)
+            self.create_water_tile(*cell)
 
     def water_all(self):
-        for index_row, row in enumerate(self.grid):
-            for index_col, cell in enumerate(row):
-                # checking if a cell/tile is soiled and not yet watered
-                if 'X' in cell and 'W' not in cell:
-                    cell.append('W')
-                    # switching the grid cell positions to actual pixel positions for the game
-                    x = index_col * TILE_SIZE
-                    y = index_row * TILE_SIZE
-                    WaterTile((x, y), choice(self.water_surfs), [self.all_sprites, self.water_sprites])
+        # water every soiled tile in one pass over the grid, only the newly watered ones need a sprite
+        for index_col, index_row in self.grid.mark_all(WATERED, where = TILLED):
+            self.create_water_tile(index_col, index_row)
 
     def remove_water(self):
-        # remove all water sprite tiles from the map
+        # hide all water sprite tiles, they stay in water_tiles to be reused
         for sprite in self.water_sprites.sprites():
             sprite.kill()
-        # remove the 'W' indicators from the soil dictionary grid
-        for row in self.grid:
-            for cell in row:
-                if 'W' in cell:
-                    cell.remove('W')
-
-    def check_watered(self, pos):
-        x = pos[0] // TILE_SIZE
-        y = pos[1] // TILE_SIZE
-        cell = self.grid[y][x]
-        is_watered = 'W' in cell
-        return is_watered
+        # remove the watered flag from the whole soil grid
+        self.grid.clear_all(WATERED)
 
     def plant_seed(self, target_pos, seed):
-        # checking if the target is hitting a soil sprite tile to allow planting
-        for soil_sprite in self.soil_sprites.sprites():
-            if soil_sprite.rect.collidepoint(target_pos):
-                self.plant_sound.play()
-
-                # convert pixel position to grid position to access soil dictionary
-                x = soil_sprite.rect.x // TILE_SIZE
-                y = soil_sprite.rect.y // TILE_SIZE
-                
-                if 'P' not in self.grid[y][x]:
-                    # add P for plant added to the soil tile and create a Plant
-                    self.grid[y][x].append('P')
-                    Plant(seed, [self.all_sprites, self.plant_sprites, self.collision_sprites], soil_sprite, self.check_watered)
-
-    def update_plants(self):
+        # checking if the target is hitting a soil tile to allow planting
+        cell = self.cell_at(target_pos)
+        soil_sprite = self.soil_tiles.get(cell)
+        if soil_sprite:
+            self.plant_sound.play()
+
+            if not self.grid.has(*cell, PLANTED):
+                # flag the soil tile as planted and create a Plant
+                self.grid.set(*cell, PLANTED)
+                self.create_plant(seed, cell)
+
+    def create_plant(self, seed, cell, age = 0):
+        plant = Plant(seed, [self.all_sprites, self.plant_sprites, self.collision_sprites], self.soil_tiles[cell])
+        plant.cell = cell
+        self.plants[cell] = plant
+        if age:
+            plant.set_age(age)
+            self.collision_sprites.refresh(plant)
+            self.all_sprites.refresh(plant)
+            if plant.harvestable:
+                self.harvestable[cell] = plant
+        return plant
+
+    def remove_plant(self, plant):
+        plant.kill()
+        self.plants.pop(plant.cell, None)
+        self.harvestable.pop(plant.cell, None)
+        self.grid.clear(*plant.cell, PLANTED)
+
+    # the harvestable plants on the cells around rect (a grown plant reaches into the cell above its soil)
+    def harvestable_near(self, rect):
+        if not self.harvestable:
+            return []
+        left, top = rect.left // TILE_SIZE - 1, rect.top // TILE_SIZE - 1
+        right, bottom = rect.right // TILE_SIZE + 1, rect.bottom // TILE_SIZE + 1
+        harvestable = self.harvestable
+        return [harvestable[(x, y)] for y in range(top, bottom + 1) for x in range(left, right + 1) if (x, y) in harvestable]
+
+    # replaces the whole farm with saved state: grid flags and (cell, plant type, age) for every plant
+    def restore(self, cells, plants):
         for plant in self.plant_sprites.sprites():
-            plant.grow()
+            plant.kill()
+        self.plants.clear()
+        self.harvestable.clear()
+        for sprite in self.water_tiles.values():
+            sprite.kill()
+        self.water_tiles.clear()
+
+        memoryview(self.grid.cells)[:] = cells
+        # the planted flags follow the plant list, a grid saved apart from it cannot leave flags without plants
+        self.grid.clear_all(PLANTED)
+        self.create_soil_tiles()
+        for index_col, index_row in self.grid.positions(WATERED):
+            self.create_water_tile(index_col, index_row)
+        for cell, plant_type, age in plants:
+            if cell in self.soil_tiles:
+                self.grid.set(*cell, PLANTED)
+                self.create_plant(plant_type, cell, age)
 
+    def update_plants(self):
+        # the planted cells that were watered today are found in one pass over the grid,
+        # dry plants are never visited
+        plants = self.plants
+        for cell in self.grid.positions(PLANTED | WATERED):
+            plant = plants.get(cell)
+            if plant and not plant.harvestable and plant.set_age(plant.age + plant.grow_speed):
+                # a plant that reached a new frame is taller and has a new hitbox, so update its collision cells and camera chunk
+                self.collision_sprites.refresh(plant)
+                self.all_sprites.refresh(plant)
+                if plant.harvestable:
+                    self.harvestable[cell] = plant
+
+    # picks the soil graphic for a tilled cell from the tilled cells around it
+    def update_soil_tile(self, x, y):
+        tile = self.soil_tiles.get((x, y))
+        if not self.grid.has(x, y, TILLED):
+            if tile:
+                tile.kill()
+                del self.soil_tiles[(x, y)]
+            return
+
+        surf = self.soil_surfs[SOIL_TILES[self.grid.neighbor_mask(x, y, TILLED)]]
+        if tile:
+            # existing tiles only swap their graphic
+            tile.image = surf
+        else:
+            self.soil_tiles[(x, y)] = SoilTile(
+                pos = (x * TILE_SIZE, y * TILE_SIZE), 
+                surf = surf, 
+                groups = [self.all_sprites, self.soil_sprites])
+
+    def update_soil_area(self, x, y):
+        # a tile only affects the graphics of itself and its four neighbours
+        for dx, dy in ((0, 0), (0, -1), (1, 0), (0, 1), (-1, 0)):
+            self.update_soil_tile(x + dx, y + dy)
+
+    # rebuilds every soil tile from the grid (e.g. after loading a save)
     def create_soil_tiles(self):
-        self.soil_sprites.empty()
-        for index_row, row in enumerate(self.grid):
-            for index_col, cell in enumerate(row):
-                if 'X' in cell:
-
-                    # determine what is around the current soil tile cell being placed
-                    # get cells above, to the left, to the right, and below
-                    t = 'X' in self.grid[index_row - 1][index_col]
-                    b = 'X' in self.grid[index_row + 1][index_col]
-                    r = 'X' in row[index_col + 1]
-                    l = 'X' in row[index_col - 1]
-
-                    # get the appropriate tile type to apply to the current cell
-                    tile_type = 'o'
-
-                    #horizontal tiles
-                    # placing center tile
-                    if all((t, r, b, l)): tile_type = 'x'
-                    # tile only to the left
-                    if l and not any((t, r, b)): tile_type = 'r'
-                    # tile only to the right
-                    if r and not any((t, l, b)): tile_type = 'l'
-                    # tile left and right of placing tile
-                    if r and l and not any((t, b)): tile_type = 'lr'
-
-                    # vertical tiles
-                    # placing bottom tile
-                    if t and not any((r, l, b)): tile_type = 'b'
-                    # placing top tile
-                    if b and not any((r, l, t)): tile_type = 't'
-                    # placing tile between top and bottom tiles only
-                    if b and t and not any((r, l)): tile_type = 'tb'
-
-                    # checking for corners
-                    # top right tile if only left/bottom tiles exist
-                    if l and b and not any((t, r)): tile_type = 'tr'
-                    # top left tile if only right/bottom tiles exist
-                    if r and b and not any((t, l)): tile_type = 'tl'
-                    # bottom right tile if onlyleft/top tiles exist 
-                    if l and t and not any((b, r)): tile_type = 'br'
-                    # bottom left tile if only bottom/left tiles exist
-                    if r and t and not any((b, l)): tile_type = 'bl'
-
-                    # adjusting/checking T shaped tile placement
-                    if all((t, b, r)) and not l: tile_type = 'tbr'
-                    if all((t, b, l)) and not r: tile_type = 'tbl'
-                    if all((l, r, t)) and not b: tile_type = 'lrb'
-                    if all((l, r, b)) and not t: tile_type = 'lrt'                   
-
-                    SoilTile(
-                        pos = (index_col * TILE_SIZE, index_row * TILE_SIZE), 
-                        surf = self.soil_surfs[tile_type], 
-                        groups = [self.all_sprites, self.soil_sprites])
+        for tile in self.soil_tiles.values():
+            tile.kill()
+        self.soil_tiles.clear()
+
+        for index_col, index_row in self.grid.positions(TILLED):
+            self.update_soil_tile(index_col, index_row)
@@ -0,0 +1,98 @@
+import pygame
+from settings import *
+
+# buckets items into square grid cells so only the cells overlapping an area need to be searched
+class SpatialHash:
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        # cell (col, row) -> items overlapping it, a dict is used as an insertion ordered set
+        self.cells = {}
+        # item -> the range of cells it was inserted into
+        self.items = {}
+
+    def cell_span(self, rect):
+        # first and last cell touched by the rect on each axis (a zero sized rect still occupies one cell)
+        size = self.cell_size
+        left, top = rect[0] // size, rect[1] // size
+        right = max(rect[0], rect[0] + rect[2] - 1) // size
+        bottom = max(rect[1], rect[1] + rect[3] - 1) // size
+        return left, top, right, bottom
+
+    def cells_in(self, span):
+        left, top, right, bottom = span
+        for row in range(top, bottom + 1):
+            for col in range(left, right + 1):
+                yield col, row
+
+    def insert(self, item, rect):
+        if item in self.items:
+            self.remove(item)
+
+        span = self.cell_span(rect)
+        self.items[item] = span
+        for cell in self.cells_in(span):
+            self.cells.setdefault(cell, {})[item] = None
+
+    def remove(self, item):
+        span = self.items.pop(item, None)
+        if span is None:
+            return
+
+        for cell in self.cells_in(span):
+            items = self.cells[cell]
+            del items[item]
+            # forget empty cells so the dict only holds occupied parts of the map
+            if not items:
+                del self.cells[cell]
+
+    def move(self, item, rect):
+        # only touch the cells when the item crossed a cell border
+        if self.items.get(item) != self.cell_span(rect):
+            self.insert(item, rect)
+
+    def query(self, rect):
+        # every item in the cells overlapping rect, without duplicates for items spanning several cells
+        found = {}
+        for cell in self.cells_in(self.cell_span(rect)):
+            items = self.cells.get(cell)
+            if items:
+                found.update(items)
+        return found
+
+    def __contains__(self, item):
+        return item in self.items
+
+    def __len__(self):
+        return len(self.items)
+
+# a sprite group that also indexes its sprites by position, to answer "what is near this rect" without a full scan
+class SpatialGroup(pygame.sprite.Group):
+    def __init__(self, cell_size = TILE_SIZE):
+        super().__init__()
+        self.index = SpatialHash(cell_size)
+        # sprites join their groups before their rect is set, so they are indexed on the next query
+        self.pending = []
+
+    def add_internal(self, sprite, layer = None):
+        super().add_internal(sprite)
+        self.pending.append(sprite)
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self.index.remove(sprite)
+
+    def bounds(self, sprite):
+        # the area covered by the sprite image and its hitbox (if it has one yet)
+        hitbox = getattr(sprite, 'hitbox', None)
+        return sprite.rect.union(hitbox) if hitbox else sprite.rect
+
+    def refresh(self, sprite):
+        # re-index a sprite after its rect or hitbox changed
+        if sprite in self.spritedict:
+            self.index.insert(sprite, self.bounds(sprite))
+
+    def near(self, rect):
+        for sprite in self.pending:
+            self.refresh(sprite)
+        self.pending.clear()
+        return self.index.query(rect)
@@ -1,8 +1,9 @@
 import pygame
 from settings import *
 from os.path import join
-from random import randint, choice
-from timers import Timer
+from random import choice, choices
+from timers import scheduler
+from support import assets
 
 class Generic(pygame.sprite.Sprite):
     def __init__(self, pos, surf, groups, z = LAYERS['main']):
@@ -18,55 +19,65 @@ class Interaction(Generic):
         super().__init__(pos, surf, groups)
         self.name = name
 
-# an animated water sprite that inherits properties from Generic
-class Water(Generic):
-    def __init__(self, pos, frames, groups):
-        # animation setup settings
+# shows the current frame of a shared animation, frames has one surface per animation frame (a tile or a baked chunk)
+# the animation clock moves every animation forward, so there is nothing to update per sprite
+class AnimatedSprite(pygame.sprite.Sprite):
+    def __init__(self, pos, frames, groups, animation, z = LAYERS['main']):
+        super().__init__(groups)
         self.frames = frames
-        self.frame_index = 0
-
-        # sprite setup
-        super().__init__(
-            pos = pos, 
-            surf = self.frames[self.frame_index], 
-            groups = groups, 
-            z = LAYERS['water'])
-
-    def animate(self, dt):
-        self.frame_index += 5 * dt
-        if self.frame_index >= len(self.frames):
-            self.frame_index = 0
-        self.image = self.frames[int(self.frame_index)]
+        self.animation = animation
+        self.rect = frames[0].get_rect(topleft = pos)
+        self.z = z
 
-    def update(self, dt):
-        self.animate(dt)
+    @property
+    def image(self):
+        return self.frames[self.animation.index]
 
 class WildFlower(Generic):
     def __init__(self, pos, surf, groups):
         super().__init__(pos, surf, groups)
         self.hitbox = self.rect.copy().inflate((-20, -self.rect.height * 0.9))
 
-# sprite that will self destroy with an internal timer to simulate a particle animation
+# sprite that will self destroy after a while to simulate a particle animation
 class Particle(Generic):
-    def __init__(self, pos, surf, groups, z, duration = 200):
-        super().__init__(pos, surf, groups, z)
-        self.start_time = pygame.time.get_ticks()
+    def __init__(self, pos, surf, groups, z, duration = 200, manager = None):
+        # white sprite surface using mask, shared by every particle made from the same surface
+        super().__init__(pos, assets.silhouette(surf), groups, z)
+        self.manager = manager
+        self.start(duration)
+
+    def start(self, duration):
+        # remove the sprite once it has been alive for the chosen duration
         self.duration = duration
-
-        # white sprite surface using mask
-        mask_surf = pygame.mask.from_surface(self.image)
-        new_surf = mask_surf.to_surface()
-        new_surf.set_colorkey((0,0,0))
-        self.image = new_surf
-
-    def update(self, dt):
-        current_time = pygame.time.get_ticks()
-        # if the sprite is alive longer than the chosen duration, remove it
-        if current_time - self.start_time > self.duration:
-            self.kill()
+        scheduler.call_later(duration / 1000, self.expire)
+
+    def expire(self):
+        self.kill()
+        # back to the pool for the next burst
+        if self.manager:
+            self.manager.free.append(self)
+
+# hands out particles from a pool, so chopping and harvesting bursts reuse sprites instead of creating new ones
+class ParticleManager:
+    def __init__(self, groups):
+        self.groups = groups
+        self.free = []
+
+    def spawn(self, pos, surf, z, duration = 200):
+        if not self.free:
+            return Particle(pos, surf, self.groups, z, duration, self)
+
+        particle = self.free.pop()
+        particle.image = assets.silhouette(surf)
+        particle.rect.size = particle.image.get_size()
+        particle.rect.topleft = pos
+        particle.z = z
+        particle.add(self.groups)
+        particle.start(duration)
+        return particle
 
 class Tree(Generic):
-    def __init__(self, pos, surf, groups, name, player_add):
+    def __init__(self, pos, surf, groups, name, player_add, particles, all_sprites):
         super().__init__(pos, surf, groups)
 
         # tree setup
@@ -74,22 +85,35 @@ class Tree(Generic):
         self.alive = True
 
         # loading correct tree based on size
+        # (images and sounds come from the asset cache so every tree shares one copy)
         if name == "Small":
-            self.stump_surf = pygame.image.load(join("graphics", "stumps", "small.png")).convert_alpha()
+            self.stump_surf = assets.image(join("graphics", "stumps", "small.png"))
         elif name == "Large":
-            self.stump_surf = pygame.image.load(join("graphics", "stumps", "large.png")).convert_alpha()
+            self.stump_surf = assets.image(join("graphics", "stumps", "large.png"))
 
         # apples setup
-        self.apple_surf = pygame.image.load(join("graphics", "fruit", "apple.png"))
+        self.apple_surf = assets.image(join("graphics", "fruit", "apple.png"))
         # get possible apple positions list based on tree name
         self.apple_pos = APPLE_POS[name]
         self.apple_sprites = pygame.sprite.Group()
+        # the group the apples are drawn by, sprite.groups() has no fixed order so it is passed in
+        self.all_sprites = all_sprites
+        # one apple sprite per position, shown and hidden every day instead of being recreated
+        self.apples = []
+        for slot, pos in enumerate(self.apple_pos):
+            apple = Generic(pos = pos, surf = self.apple_surf, groups = [], z = LAYERS['fruit'])
+            apple.slot = slot
+            self.apples.append(apple)
         self.create_fruit()
 
         self.player_add = player_add
 
+        # chopping flashes come from the level's particle pool, their silhouettes are made now instead of mid game
+        self.particles = particles
+        assets.preload(silhouettes = [surf, self.apple_surf])
+
         # game sounds
-        self.axe_sound = pygame.mixer.Sound(join("audio", "axe.mp3"))
+        self.axe_sound = assets.sound(join("audio", "axe.mp3"))
 
     def damage(self):
         # applying damage to the tree
@@ -101,10 +125,9 @@ class Tree(Generic):
         # removing a random apple when hitting with an axe
         if len(self.apple_sprites.sprites()) > 0:
             random_apple = choice(self.apple_sprites.sprites())
-            Particle(
+            self.particles.spawn(
                 pos = random_apple.rect.topleft,
                 surf = random_apple.image,
-                groups = self.groups()[0],
                 z = LAYERS['fruit']
             )
             self.player_add('apple')
@@ -112,30 +135,50 @@ class Tree(Generic):
 
     def check_death(self):
         if self.health <= 0:
-            Particle(
+            self.particles.spawn(
                 pos = self.rect.topleft,
                 surf = self.image,
-                groups = self.groups()[0],
                 z = LAYERS['fruit'],
                 duration = 300
-            )            
-            self.image = self.stump_surf
-            self.rect = self.image.get_rect(midbottom = self.rect.midbottom)
-            self.hitbox = self.rect.copy().inflate(-10, -self.rect.height * 0.6)
-            self.alive = False
+            )
+            self.make_stump()
             self.player_add('wood')
 
+    def make_stump(self):
+        self.image = self.stump_surf
+        self.rect = self.image.get_rect(midbottom = self.rect.midbottom)
+        self.hitbox = self.rect.copy().inflate(-10, -self.rect.height * 0.6)
+        # let the collision broadphase and the camera chunks pick up the stump
+        for group in self.groups():
+            if hasattr(group, 'refresh'):
+                group.refresh(self)
+        self.alive = False
+
     def update(self, dt):
         if self.alive:
             self.check_death()
 
-    def create_fruit(self):
-        for pos in self.apple_pos:
-            if randint(0, 10) < 2:
-                x = pos[0] + self.rect.left
-                y = pos[1] + self.rect.top
-
-                Generic(pos = (x, y), 
-                surf = self.apple_surf, 
-                groups = [self.apple_sprites, self.groups()[0]],
-                z = LAYERS['fruit'])
+    # bit i is set when apple position i has an apple
+    def fruit_mask(self):
+        return sum(1 << apple.slot for apple in self.apple_sprites)
+
+    def create_fruit(self, mask = None):
+        # without a mask every position grows an apple at random (2 in 11)
+        if mask is None:
+            self.set_fruit(choices((True, False), weights = (2, 9), k = len(self.apples)))
+        else:
+            self.set_fruit([(mask >> slot) & 1 for slot in range(len(self.apples))])
+
+    # grows is one flag per apple position
+    def set_fruit(self, grows):
+        for apple, pos, grow in zip(self.apples, self.apple_pos, grows):
+            if grow:
+                pos = (pos[0] + self.rect.left, pos[1] + self.rect.top)
+                # an apple that has to move (the tree became a stump) is filed again by being re-added
+                if apple.alive() and apple.rect.topleft != pos:
+                    apple.kill()
+                apple.rect.topleft = pos
+                if not apple.alive():
+                    apple.add(self.apple_sprites, self.all_sprites)
+            else:
+                apple.kill()
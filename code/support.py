@@ -1,22 +1,122 @@
 from os import walk
+from os.path import join
 import pygame
 
-# obtains a list of only the image files within the given directory
+# process-wide asset cache: every image, frame list and sound is decoded from disk once and then shared
+class AssetCache:
+    def __init__(self):
+        # (path, alpha) -> surface
+        self.surfaces = {}
+        # (path, alpha) -> frames list / (path, alpha, 'dict') -> frames dict
+        self.folders = {}
+        # path -> sound
+        self.sounds = {}
+        # id(surface) -> (surface, white silhouette), the surface is kept so its id is never reused
+        self.silhouettes = {}
+
+        # counters for the asset report
+        self.hits = 0
+        self.misses = 0
+
+    def image(self, path, alpha = True):
+        key = (path, alpha)
+        if key in self.surfaces:
+            self.hits += 1
+            return self.surfaces[key]
+
+        self.misses += 1
+        surf = pygame.image.load(path)
+        if alpha:
+            surf = surf.convert_alpha()
+        self.surfaces[key] = surf
+        return surf
+
+    def folder_files(self, path):
+        # image file names in the folder, sorted so frame order is the same on every platform
+        for _, _, img_files in walk(path):
+            return sorted(img_files)
+        return []
+
+    # obtains a list of only the image files within the given directory
+    def folder(self, path, alpha = True):
+        key = (path, alpha)
+        if key in self.folders:
+            self.hits += 1
+            return self.folders[key]
+
+        self.misses += 1
+        frames = [self.image(join(path, image), alpha) for image in self.folder_files(path)]
+        self.folders[key] = frames
+        return frames
+
+    # obtains a dictionary of key value pairs consiting of the name of the file with its image
+    def folder_dict(self, path, alpha = True):
+        key = (path, alpha, 'dict')
+        if key in self.folders:
+            self.hits += 1
+            return self.folders[key]
+
+        self.misses += 1
+        frames = {image.split('.')[0]: self.image(join(path, image), alpha) for image in self.folder_files(path)}
+        self.folders[key] = frames
+        return frames
+
+    # the sound is shared too, so a set_volume call applies to every user of that file
+    def sound(self, path):
+        if path in self.sounds:
+            self.hits += 1
+            return self.sounds[path]
+
+        self.misses += 1
+        sound = pygame.mixer.Sound(path)
+        self.sounds[path] = sound
+        return sound
+
+    # the white flash of a surface's shape (e.g. for particles), computed once per surface
+    def silhouette(self, surf):
+        entry = self.silhouettes.get(id(surf))
+        if entry:
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        silhouette = pygame.mask.from_surface(surf).to_surface()
+        silhouette.set_colorkey((0, 0, 0))
+        self.silhouettes[id(surf)] = (surf, silhouette)
+        return silhouette
+
+    def preload(self, images = (), folders = (), sounds = (), silhouettes = ()):
+        # warm the cache up front (e.g. during level setup) so nothing is decoded mid game
+        for path in images:
+            self.image(path)
+        for path in folders:
+            self.folder(path)
+        for path in sounds:
+            self.sound(path)
+        for surf in silhouettes:
+            self.silhouette(surf)
+
+    def report(self):
+        # every frame list holds surfaces from self.surfaces, so only those take up memory
+        surfaces = list(self.surfaces.values()) + [silhouette for _, silhouette in self.silhouettes.values()]
+        surface_bytes = sum(surf.get_width() * surf.get_height() * surf.get_bytesize() for surf in surfaces)
+        frequency, size, channels = pygame.mixer.get_init() or (44100, -16, 2)
+        sound_bytes = sum(sound.get_length() * frequency * channels * abs(size) // 8 for sound in self.sounds.values())
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'surfaces': len(self.surfaces),
+            'folders': len(self.folders),
+            'sounds': len(self.sounds),
+            'silhouettes': len(self.silhouettes),
+            'surface_bytes': surface_bytes,
+            'sound_bytes_estimate': int(sound_bytes)
+        }
+
+assets = AssetCache()
+
 def import_folder(path):
-    surface_list = []
-    for _, _, img_files in walk(path):
-        for image in img_files:
-            full_path = path + '\\' + image
-            image_surf = pygame.image.load(full_path).convert_alpha()
-            surface_list.append(image_surf)
-    return surface_list
-
-# obtains a dictionary of key value pairs consiting of the name of the file with its image
+    return assets.folder(path)
+
 def import_folder_dict(path):
-    surface_dict = {}
-    for _, _, img_files in walk(path):
-        for image in img_files:
-            full_path = path + '\\' + image
-            image_surf = pygame.image.load(full_path).convert_alpha()
-            surface_dict[image.split('.')[0]] = image_surf
-    return surface_dict
+    return assets.folder_dict(path)
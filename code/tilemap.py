@@ -0,0 +1,136 @@
+import pygame
+import pickle
+from os import listdir
+from os.path import join, dirname, getmtime, exists, normpath
+from xml.etree import ElementTree
+from pytmx import TiledTileLayer, TiledObjectGroup
+from pytmx.util_pygame import load_pygame
+from settings import *
+
+# bump when the layout of the on-disk cache changes
+MAP_CACHE_VERSION = 1
+
+# a tiled object (tree, flower, player start...) with only the data the game reads
+class MapObject:
+    def __init__(self, name, x, y, width, height, image):
+        self.name = name
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.image = image
+
+# the parsed map: tile layers, object layers and world dimensions shared by every subsystem
+class TileMap:
+    def __init__(self, width, height, tile_layers, object_layers):
+        # size in tiles
+        self.width = width
+        self.height = height
+        # size in pixels
+        self.pixel_width = width * TILE_SIZE
+        self.pixel_height = height * TILE_SIZE
+
+        # layer name -> [(x, y, surf)] and layer name -> [MapObject]
+        self.tile_layers = tile_layers
+        self.object_layers = object_layers
+
+    def tiles(self, layer):
+        return self.tile_layers.get(layer, [])
+
+    def objects(self, layer):
+        return self.object_layers.get(layer, [])
+
+    @classmethod
+    def from_tmx(cls, path):
+        tmx_data = load_pygame(path)
+
+        tile_layers, object_layers = {}, {}
+        for layer in tmx_data.layers:
+            if isinstance(layer, TiledTileLayer):
+                tile_layers[layer.name] = list(layer.tiles())
+            elif isinstance(layer, TiledObjectGroup):
+                object_layers[layer.name] = [
+                    MapObject(obj.name, obj.x, obj.y, obj.width, obj.height, obj.image) for obj in layer]
+
+        return cls(tmx_data.width, tmx_data.height, tile_layers, object_layers)
+
+    # the on-disk cache stores raw RGBA pixels of every distinct tile image, so loading it skips both the XML and the PNG decoding
+    def dump(self):
+        images = {}
+        def image_id(surf):
+            if surf is None:
+                return None
+            if id(surf) not in images:
+                images[id(surf)] = (len(images), surf.get_size(), pygame.image.tostring(surf, 'RGBA'))
+            return images[id(surf)][0]
+
+        tile_layers = {name: [(x, y, image_id(surf)) for x, y, surf in tiles] for name, tiles in self.tile_layers.items()}
+        object_layers = {name: [(obj.name, obj.x, obj.y, obj.width, obj.height, image_id(obj.image)) for obj in objects]
+            for name, objects in self.object_layers.items()}
+
+        return {
+            'size': (self.width, self.height),
+            'images': [(size, pixels) for _, size, pixels in sorted(images.values())],
+            'tile_layers': tile_layers,
+            'object_layers': object_layers}
+
+    @classmethod
+    def load(cls, data):
+        images = [pygame.image.fromstring(pixels, size, 'RGBA').convert_alpha() for size, pixels in data['images']]
+        image = lambda index: None if index is None else images[index]
+
+        tile_layers = {name: [(x, y, image(index)) for x, y, index in tiles] for name, tiles in data['tile_layers'].items()}
+        object_layers = {name: [MapObject(obj_name, x, y, w, h, image(index)) for obj_name, x, y, w, h, index in objects]
+            for name, objects in data['object_layers'].items()}
+
+        return cls(*data['size'], tile_layers, object_layers)
+
+def image_sources(path):
+    # the images a map or tileset file references (the cache holds their decoded pixels)
+    return [normpath(join(dirname(path), image.get('source'))) for image in ElementTree.parse(path).iter('image') if image.get('source')]
+
+def map_signature(path):
+    # the cache is invalidated when the map, any tileset next to it or any image they use changes
+    tileset_dir = join(dirname(path), 'Tilesets')
+    files = [path] + ([join(tileset_dir, name) for name in sorted(listdir(tileset_dir))] if exists(tileset_dir) else [])
+    images = sorted({image for name in files if name.endswith(('.tmx', '.tsx')) for image in image_sources(name)})
+    return MAP_CACHE_VERSION, [(name, getmtime(name)) for name in files + images if exists(name)]
+
+def read_map_cache(cache_path, signature):
+    if not exists(cache_path):
+        return None
+    try:
+        with open(cache_path, 'rb') as file:
+            cached_signature, data = pickle.load(file)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+        return None
+    return data if cached_signature == signature else None
+
+def write_map_cache(cache_path, signature, data):
+    try:
+        with open(cache_path, 'wb') as file:
+            pickle.dump((signature, data), file, pickle.HIGHEST_PROTOCOL)
+    except OSError:
+        # the cache is only an optimisation, the game runs fine without it
+        pass
+
+# every map is parsed once per process and then shared
+loaded_maps = {}
+
+def load_map(path = MAP_PATH, cache_path = MAP_CACHE_PATH):
+    if path in loaded_maps:
+        return loaded_maps[path]
+
+    if cache_path:
+        signature = map_signature(path)
+        data = read_map_cache(cache_path, signature)
+        if data is not None:
+            tile_map = TileMap.load(data)
+        else:
+            tile_map = TileMap.from_tmx(path)
+            write_map_cache(cache_path, signature, tile_map.dump())
+    else:
+        tile_map = TileMap.from_tmx(path)
+
+    loaded_maps[path] = tile_map
+    return tile_map
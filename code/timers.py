@@ -1,25 +1,70 @@
-import pygame
+import heapq
+from itertools import count
+
+# a callback waiting in the scheduler, cancelling only marks it so the heap never has to be searched
+class ScheduledCall:
+    __slots__ = ('func', 'cancelled')
+
+    def __init__(self, func):
+        self.func = func
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+# runs callbacks when their deadline on the simulation clock is reached
+# deadlines sit in a min-heap, so a frame only costs as much as the callbacks that are due
+class Scheduler:
+    def __init__(self):
+        self.time = 0
+        self.heap = []
+        # breaks ties between equal deadlines in the order they were scheduled
+        self.order = count()
+
+    def call_later(self, delay, func):
+        # delay is in seconds of simulation time
+        call = ScheduledCall(func)
+        heapq.heappush(self.heap, (self.time + delay, next(self.order), call))
+        return call
+
+    def update(self, dt):
+        # simulation time only moves while the game is updated, so pausing or fast forwarding is handled for free
+        self.time += dt
+        while self.heap and self.heap[0][0] <= self.time:
+            _, _, call = heapq.heappop(self.heap)
+            if not call.cancelled:
+                call.func()
+
+    def clear(self):
+        self.heap.clear()
+
+scheduler = Scheduler()
 
 # Custom timer that can be turned on/off
 # Used to limit the number of allowed inputs to the game
 class Timer:
-    def __init__(self, duration, func = None):
+    def __init__(self, duration, func = None, scheduler = scheduler):
         self.duration = duration
         self.func = func
-        self.start_time = 0
+        self.scheduler = scheduler
+        self.call = None
         self.active = False
 
     def activate(self):
+        # activating a running timer starts it over
+        if self.call:
+            self.call.cancel()
         self.active = True
-        self.start_time = pygame.time.get_ticks()
+        self.call = self.scheduler.call_later(self.duration / 1000, self.finish)
 
     def deactivate(self):
         self.active = False
-        self.start_time = 0
-
-    def update(self):
-        current_time = pygame.time.get_ticks()
-        if current_time - self.start_time >= self.duration:            
-            if self.func and self.start_time != 0:
-                self.func()
-            self.deactivate()
+        if self.call:
+            self.call.cancel()
+            self.call = None
+
+    def finish(self):
+        self.call = None
+        self.deactivate()
+        if self.func:
+            self.func()
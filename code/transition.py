@@ -1,20 +1,17 @@
-import pygame
-from settings import *
-
 class Transition:
-    def __init__(self, reset, player):
+    def __init__(self, reset, player, lighting):
         # transition setup
-        self.display_surface = pygame.display.get_surface()
         self.reset = reset
         self.player = player
 
-        # overlay setup
-        self.image = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        # the darkness is applied by the shared lighting pass
+        self.lighting = lighting
         self.color = 255
-        self.speed = -1.5
+        # color change per second
+        self.speed = -90
 
-    def play(self):
-        self.color += self.speed
+    def update(self, dt):
+        self.color += self.speed * dt
 
         # once the screen goes fully dark, reset the level
         if self.color <= 0:
@@ -26,7 +23,7 @@ class Transition:
         if self.color > 255:
             self.color = 255
             self.player.sleep = False
-            self.speed = -2
+            self.speed = -120
 
-        self.image.fill((self.color, self.color, self.color))
-        self.display_surface.blit(self.image, (0,0), special_flags = pygame.BLEND_RGBA_MULT)
+    def display(self):
+        self.lighting.tint((self.color, self.color, self.color))